@@ -229,6 +229,7 @@ class Main(QMainWindow):
 			self.startStop()
 		self.field.connectSledServer(args.sledServer)     # defaults to simulator
 		self.field.connectPositionServer(args.positionServer) # defaults to sledserver
+		self.field.waitReady()                                # both streams have samples and a clock
 		if args.stereo:
 			self.field.toggleStereo(True)
 		if args.stereoSim:
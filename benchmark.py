@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Throughput and latency benchmark of the tracker clients against a local
+rtc3dserver.SyntheticServer in a child process (so its CPU time is not counted).
+
+	python benchmark.py --client fp --markers 100 --json bench.json
+
+Two scenarios are run: throughput (server as fast as possible) and latency (server
+at --rate in real time). Reported per scenario:
+	packagesPerSecond: decoded packages per second
+	cpuPerPackage:     process CPU time per decoded package while the benchmark sleeps (s)
+	serverToArrival:   percentiles of server send to client arrival time (s)
+	arrivalToVisible:  percentiles of client arrival to visible in the client's buffer (s)
+	getPosition:       percentiles of the cost of one getPosition call (s)
+	memoryGrowth:      growth of the maximum resident set size after warming up (bytes), None
+	                   where the resource module is missing (MS Windows)
+	latency:           network, queueing and jitter histograms of the client, see latency.py
+Python 3 only.
+"""
+from __future__ import print_function
+import sys, time, json, argparse, logging, multiprocessing, numpy as np
+import fpclient, sledclient, rtc3dserver
+try:
+	import resource
+except ImportError: # MS Windows
+	resource = None
+
+percentiles = [50, 90, 99, 99.9]
+
+def serve(port, speed, rate, nMarker):
+	"Child process: run a synthetic server until killed."
+	server = rtc3dserver.SyntheticServer(port, "localhost", speed, rate, nMarker, wallClock=True)
+	server.start()
+	while True:
+		time.sleep(1)
+
+def maxRss():
+	"Maximum resident set size in bytes, None without the resource module (Unix only)."
+	if resource is None:
+		return None
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return rss if sys.platform == "darwin" else rss*1024
+
+def lastSample(client):
+	"Return (number of samples, server time, arrival time) of the last sample of client."
+	history = client.history
+	while True:
+		seq = history.begin()
+		n = history.n
+		(p, t, ta) = history.last(1)
+		(t, ta) = (t[0], ta[0])
+		if not history.retry(seq, 1):
+			return (n, client.clock.toServer(t), ta)
+
+def summary(x):
+	if len(x) == 0:
+		return None
+	return dict(zip(["p{}".format(p) for p in percentiles], np.percentile(x, percentiles).tolist()))
+
+def run(ClientClass, port, duration, speed, rate, nMarker, nCall=10000, **clientArgs):
+	"Run one scenario and return its results as a dict."
+	server = multiprocessing.Process(target=serve, args=(port, speed, rate, nMarker))
+	server.daemon = True
+	server.start()
+	time.sleep(0.5) # let the server listen
+	client = ClientClass(**clientArgs)
+	client.connect("localhost", port)
+	client.startStream()
+	time.sleep(0.5) # warm up
+
+	# passive: throughput and CPU
+	rss0 = maxRss()
+	latency = client.measureLatency()
+	(n0, tServer, ta) = lastSample(client)
+	cpu0 = time.process_time()
+	t0 = time.time()
+	time.sleep(duration)
+	cpu = time.process_time() - cpu0
+	elapsed = time.time() - t0
+	(n, tServer, ta) = lastSample(client)
+	nPackage = n - n0
+
+	# latency, polled from this thread
+	serverToArrival = []
+	arrivalToVisible = []
+	nLast = n
+	t0 = time.time()
+	while time.time() < t0 + duration:
+		(n, tServer, ta) = lastSample(client)
+		if n != nLast:
+			tVisible = client.time()
+			serverToArrival.append(ta - tServer)
+			arrivalToVisible.append(tVisible - ta)
+			nLast = n
+		time.sleep(0.0002)
+
+	# active: cost of getPosition as called by Field.paintGL
+	cost = np.zeros(nCall)
+	for i in range(nCall):
+		tCall = time.perf_counter()
+		client.getPosition(client.time()+5./60)
+		cost[i] = time.perf_counter() - tCall
+
+	results = {
+		"client": ClientClass.__name__,
+		"speed": speed,
+		"rate": rate,
+		"markers": nMarker,
+		"duration": elapsed,
+		"packages": nPackage,
+		"packagesPerSecond": nPackage/elapsed,
+		"cpuPerPackage": cpu/nPackage if nPackage else None,
+		"serverToArrival": summary(serverToArrival),
+		"arrivalToVisible": summary(arrivalToVisible),
+		"getPosition": summary(cost),
+		"memoryGrowth": None if rss0 is None else maxRss() - rss0,
+		"latency": latency.summary(),
+		}
+	client.stopStream()
+	client.thread.join(3)
+	server.terminate()
+	server.join()
+	return results
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.WARNING)
+	parser = argparse.ArgumentParser(description="tracker client benchmark")
+	parser.add_argument("--client", choices=["fp", "sled"], default="fp")
+	parser.add_argument("--port", type=int, default=3020)
+	parser.add_argument("--markers", type=int, default=20)
+	parser.add_argument("--rate", type=float, default=400.0, help="frames per second in the latency scenario")
+	parser.add_argument("--duration", type=float, default=10.0, help="s per scenario")
+	parser.add_argument("--kernelTimestamps", action="store_true", help="arrival times from the kernel")
+	parser.add_argument("--json", default="", help="write results to this file ('-' for stdout)")
+	args = parser.parse_args()
+	ClientClass = {"fp": fpclient.FpClient, "sled": sledclient.SledClient}[args.client]
+	results = []
+	for (name, speed) in [("throughput", 0), ("latency", 1.0)]:
+		result = run(ClientClass, args.port, args.duration, speed, args.rate, args.markers, kernelTimestamps=args.kernelTimestamps)
+		result["scenario"] = name
+		results.append(result)
+		print("{:10s} {:8.0f} packages/s  {:6.1f} us CPU/package  getPosition p50 {:5.1f} us p99 {:5.1f} us  arrival to visible p99 {:5.2f} ms".format(
+			name, result["packagesPerSecond"], 1e6*(result["cpuPerPackage"] or 0),
+			1e6*result["getPosition"]["p50"], 1e6*result["getPosition"]["p99"],
+			1e3*result["arrivalToVisible"]["p99"] if result["arrivalToVisible"] else float('nan')))
+	if args.json == "-":
+		json.dump(results, sys.stdout, indent=1)
+	elif args.json:
+		with open(args.json, "w") as f:
+			json.dump(results, f, indent=1)
@@ -0,0 +1,82 @@
+from __future__ import print_function
+import numpy as np
+
+class ClockEstimator(object):
+	"""Online estimate of offset and drift between a server clock and the client clock.
+
+	Every data package gives a pair (server time, client arrival time). The difference
+	client - server is the clock offset plus a network and scheduling delay that is
+	never negative. A line is fitted through the differences in a sliding window
+	(the slope is the drift) and moved down to the low percentile of the residuals,
+	so it follows the packages with the smallest delay (a minimum delay filter).
+	The drift is only fitted once the window spans minSpan s or is full, before that the
+	last drift (0 at the start) is kept and only the offset is fitted.
+	update() is O(1), the fit runs on the whole window every nFit packages.
+	The estimate is replaced with one assignment, so readers need no lock."""
+	def __init__(self, capacity=4000, nFit=100, percentile=5, minSpan=10.0):
+		self.capacity = capacity     # number of packages in the window
+		self.nFit = nFit             # packages between fits
+		self.percentile = percentile # residual percentile of the minimum delay line
+		self.minSpan = minSpan       # s of server time needed to fit the drift
+		self.drift = 0.0             # last fitted drift
+		self.tServer = np.zeros(capacity)
+		self.tDifference = np.zeros(capacity) # client - server
+		self.n = 0
+		# (server reference time, offset at reference time, drift, residual std, residual median)
+		self.estimate = None
+
+	def update(self, tServer, tClient):
+		"Add a package with server time tServer that arrived at client time tClient."
+		i = self.n % self.capacity
+		self.tServer[i] = tServer
+		self.tDifference[i] = tClient - tServer
+		self.n += 1
+		if self.n <= 10 or self.n % self.nFit == 0:
+			self.fit()
+
+	def fit(self):
+		"Fit the minimum delay line through the window."
+		n = min(self.n, self.capacity)
+		x = self.tServer[:n]
+		y = self.tDifference[:n]
+		tRef = x.max()
+		if n < 3 or (tRef - x.min() < self.minSpan and n < self.capacity):
+			# too short for the drift, a few ms of jitter would make it percents
+			residual = y - self.drift*(x - tRef)
+			offset = np.percentile(residual, self.percentile)
+			self.estimate = (tRef, offset, self.drift, residual.std(), np.median(residual) - offset)
+			return
+		x = x - tRef
+		xMean = x.mean()
+		yMean = y.mean()
+		drift = np.dot(x-xMean, y-yMean) / np.dot(x-xMean, x-xMean)
+		residual = y - yMean - drift*(x-xMean)
+		offset = yMean - drift*xMean + np.percentile(residual, self.percentile)
+		self.drift = drift
+		self.estimate = (tRef, offset, drift, residual.std(), np.median(residual) - np.percentile(residual, self.percentile))
+
+	def restart(self):
+		"""Forget the window but keep the estimate and the drift until the next package, for
+		instance after a reconnect, when the server clock may have restarted. The offset is
+		then fitted again from the first packages."""
+		self.n = 0
+
+	def ready(self):
+		"Return True if there is an estimate."
+		return self.estimate is not None
+
+	def toClient(self, tServer):
+		"Convert server time to client time."
+		(tRef, offset, drift, std, delay) = self.estimate
+		return tServer + offset + drift*(tServer - tRef)
+
+	def toServer(self, tClient):
+		"Convert client time to server time."
+		(tRef, offset, drift, std, delay) = self.estimate
+		return (tClient - offset + drift*tRef) / (1 + drift)
+
+	def getEstimate(self):
+		"""Return (offset, drift, residual std, median excess delay), offset is client - server
+		time at the last fit, drift in s/s, the other two in s."""
+		(tRef, offset, drift, std, delay) = self.estimate
+		return (offset, drift, std, delay)
@@ -157,9 +157,9 @@ class Field(QGLWidget):
 			self.state = "sleep"
 			self.requestSleep = False
 			self.parent().parent().toggleText(True)
-			self.sledClient.sendCommand("Lights On")
+			self.sledClient.command("Lights On") # does not wait for the response
 		elif self.state=="sleep" or self.state=="home":
-			self.sledClient.sendCommand("Lights Off")
+			self.sledClient.command("Lights Off")
 			self.state = "fadeIn"
 			self.swapMoves = np.random.uniform()>0.5
 			if self.swapMoves:
@@ -325,10 +325,9 @@ class Field(QGLWidget):
 		else:
 			self.sledClient = sledclient.SledClient() # derived from FPClient
 			self.sledClient.connect(server)
-			self.sledClient.startStream()
-			time.sleep(2)
+			self.sledClient.startStream()                    # samples arrive later, see waitReady
 		self.h = -self.conditions.trial['dReference']
-		self.sledClient.goto(self.h) # homing sled at -reference
+		self.sledClient.goto(self.h) # homing sled at -reference, goes on the wire after the startup commands of startStream
 		self.sledClientSimulator.warpto(self.h) # homing sled at -reference
 	
 	def connectPositionServer(self, server=None):
@@ -341,9 +340,18 @@ class Field(QGLWidget):
 			return
 		else:
 			self.positionClient = fpclient.FpClient()            # make a new NDI First Principles client
-			#self.positionClient.connect(server)                  # connect the client to the First Principles server
-			self.positionClient.startStream()                    # start the synchronization stream. 
-			time.sleep(2)
+			self.positionClient.subscribe(0)                     # only the first marker is used
+			self.positionClient.connect(server)                   # connect the client to the First Principles server
+			self.positionClient.startStream()                    # start the synchronization stream, see waitReady
+
+	def waitReady(self, timeout=5.0):
+		""" Wait until the sled and position clients can extrapolate, at most timeout s for both.
+		Both streams are started by the connect functions, so they warm up concurrently. """
+		tEnd = time.time() + timeout
+		for name in ["sledClient", "positionClient"]:
+			client = getattr(self, name, None)
+			if hasattr(client, "waitReady") and not client.waitReady(max(0.0, tEnd - time.time())):
+				logging.warning("{} not ready after {} s".format(name, timeout))
 
 	def openShutter(self, left=False, right=False):
 		"""open shutter glasses"""
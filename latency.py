@@ -0,0 +1,85 @@
+"""Latency histograms of a tracker client, see Rtc3dClient.measureLatency.
+
+For every decoded data package three delays are counted:
+	network:  arrival time minus the server time on the client clock. The clock estimate is
+	          fitted to the fastest packages, so this is the delay above the minimum network delay.
+	queueing: time from arrival to the start of decoding in the client. Only meaningful
+	          with kernel time stamps (Rtc3dClient kernelTimestamps), otherwise it only
+	          contains the time between reading the socket and decoding. Packages that
+	          are read from the socket at once share the time stamp of the last of them,
+	          see FrameReader.enableTimestamps.
+	jitter:   absolute difference between the arrival interval and the server interval of
+	          consecutive packages.
+"""
+from __future__ import print_function
+import math, numpy as np
+
+class Histogram(object):
+	"""Histogram with logarithmic bins from xMin to xMax (s), nPerDecade per decade. Values
+	below xMin are counted in the first bin, above xMax in the last. add is O(1)."""
+	def __init__(self, xMin=1e-6, xMax=1.0, nPerDecade=20):
+		self.xMin = xMin
+		self.nPerDecade = nPerDecade
+		nBin = int(round(nPerDecade*math.log10(xMax/xMin)))
+		self.edges = xMin*10**(np.arange(nBin+1)/float(nPerDecade))
+		self.counts = np.zeros(nBin+2, dtype=np.int64) # underflow, bins, overflow
+		self.n = 0
+		self.total = 0.0
+
+	def add(self, x):
+		if x < self.xMin:
+			i = 0
+		else:
+			i = min(int(self.nPerDecade*math.log10(x/self.xMin)) + 1, len(self.counts)-1)
+		self.counts[i] += 1
+		self.n += 1
+		self.total += x
+
+	def percentile(self, q):
+		"Return the upper edge of the bin that holds percentile q, an upper bound on it."
+		if self.n == 0:
+			return float('nan')
+		i = int(np.searchsorted(np.cumsum(self.counts), q/100.0*self.n))
+		if i == 0:
+			return self.xMin
+		return float(self.edges[min(i, len(self.edges)-1)])
+
+	def mean(self):
+		return self.total/self.n if self.n else float('nan')
+
+	def summary(self, percentiles=(50, 90, 99, 99.9)):
+		result = dict(("p{}".format(q), self.percentile(q)) for q in percentiles)
+		result["mean"] = self.mean()
+		result["n"] = self.n
+		return result
+
+class LatencyStats(object):
+	"Network, queueing and jitter histograms, filled by the stream thread."
+	def __init__(self, **kwargs):
+		self.network = Histogram(**kwargs)
+		self.queueing = Histogram(**kwargs)
+		self.jitter = Histogram(**kwargs)
+		self.tServer = None # of the last package
+		self.tArrival = None
+
+	def add(self, tServer, tArrival, tDecode, tServerClient=None):
+		"""Count a package with server time tServer, arrival time tArrival and start of decoding
+		tDecode. tServerClient is the server time on the client clock, if it is known."""
+		if tServerClient is not None:
+			self.network.add(tArrival - tServerClient)
+		self.queueing.add(tDecode - tArrival)
+		if self.tServer is not None and tServer > self.tServer:
+			self.jitter.add(abs((tArrival - self.tArrival) - (tServer - self.tServer)))
+		self.tServer = tServer
+		self.tArrival = tArrival
+
+	def summary(self):
+		"Return a dict of summary dicts, see Histogram.summary."
+		return {"network": self.network.summary(), "queueing": self.queueing.summary(), "jitter": self.jitter.summary()}
+
+	def __str__(self):
+		lines = []
+		for (name, s) in sorted(self.summary().items()):
+			lines.append("{:9s} n {:7d}  p50 {:8.3f} ms  p99 {:8.3f} ms  p99.9 {:8.3f} ms".format(
+				name, s["n"], 1e3*s["p50"], 1e3*s["p99"], 1e3*s["p99.9"]))
+		return "\n".join(lines)
@@ -0,0 +1,115 @@
+"""Merge the marker streams of several First Principles servers on one client clock."""
+from __future__ import print_function
+import time, logging, numpy as np
+import fpclient
+
+class MergeClient(object):
+	"""Client for several First Principles servers, for instance head markers and a sled encoder.
+
+	Every source is an FpClient with its own clock estimate, so all of them can be evaluated
+	at the same client time. getPosition returns the markers of all sources stacked in
+	connection order, getFrames resamples the buffered histories onto common times."""
+	def __init__(self, loop=None):
+		self.clients = []
+		self.loop = loop # rtc3dasync.StreamLoop, or None for a stream thread per client
+
+	def connect(self, host="localhost", port=None, ClientClass=fpclient.FpClient, **kwargs):
+		"Make a client of ClientClass (with arguments kwargs), connect it and start streaming."
+		client = ClientClass(**kwargs)
+		if self.loop is None:
+			client.connect(host, port)
+			client.startStream()
+		else:
+			self.loop.connect(client, host, port)
+		return self.add(client)
+
+	def add(self, client):
+		"Add a client that is already streaming."
+		self.clients.append(client)
+		return client
+
+	def stopStream(self):
+		for client in self.clients:
+			client.stopStream()
+
+	def close(self):
+		for client in self.clients:
+			client.close()
+
+	def time(self):
+		return self.clients[0].time()
+
+	def ready(self):
+		"Return True if all sources can be extrapolated."
+		return all(client.predictor.ready() for client in self.clients)
+
+	def waitReady(self, timeout=None):
+		"Wait until all sources can be extrapolated, at most timeout s in total."
+		tEnd = None if timeout is None else time.time() + timeout
+		for client in self.clients:
+			if not client.waitReady(None if tEnd is None else max(0.0, tEnd - time.time())):
+				return False
+		return True
+
+	def getSlices(self):
+		"Return the range of merged marker indices per source, in connection order."
+		slices = []
+		start = 0
+		for client in self.clients:
+			n = client.predictor.shape[0]
+			slices.append(slice(start, start+n))
+			start += n
+		return slices
+
+	def getPosition(self, t=None, dt=None, out=None):
+		"""Extrapolate all sources to client time t (or now + dt) and return their markers stacked.
+		If out (nMarker x 3 array) is given, the result is written into it."""
+		if not self.ready():
+			logging.error("MergeClient was not yet initialized when getPosition request was received")
+			return np.matrix([0,0,0])
+		if t is None:
+			t = self.time() + (dt or 0)
+		slices = self.getSlices()
+		if out is None:
+			p = np.asmatrix(np.empty((slices[-1].stop, 3)))
+		else:
+			p = out
+		for (client, s) in zip(self.clients, slices):
+			client.getPosition(t, out=np.asarray(p)[s])
+		return p
+
+	def getPositions(self, times, out=None):
+		"""Extrapolate all sources to an array of client times, return an nTimes x nMarker x 3 
+		array with the markers of all sources stacked, written into out if given."""
+		if not self.ready():
+			logging.error("MergeClient was not yet initialized when getPositions request was received")
+			return np.zeros((np.size(times), 1, 3))
+		slices = self.getSlices()
+		if out is None:
+			out = np.empty((np.size(times), slices[-1].stop, 3))
+		for (client, s) in zip(self.clients, slices):
+			out[:,s] = client.getPositions(times)
+		return out
+
+	def getFrames(self, times):
+		"""Resample the buffered histories of all sources linearly onto client times (array).
+		Return an nTimes x nMarker x 3 array, times outside a history get its first or last sample.
+		Until every source has two samples there is nothing to interpolate and the frames are empty."""
+		times = np.asarray(times, dtype=float)
+		if not self.clients or any(len(client.history) < 2 for client in self.clients):
+			logging.error("MergeClient was not yet initialized when getFrames request was received")
+			return np.zeros((np.size(times), 0, 3))
+		frames = []
+		for client in self.clients:
+			history = client.history
+			while True:
+				seq = history.begin()
+				k = min(len(history), history.capacity - min(64, history.capacity//2)) # leave the writer some room
+				(p, t, ta) = history.last(k)
+				i = np.clip(np.searchsorted(t, times), 1, k-1)
+				w = np.clip((times - t[i-1]) / np.maximum(t[i] - t[i-1], 1e-9), 0, 1)
+				frame = p[i-1] + w[:,None,None]*(p[i] - p[i-1])
+				if not history.retry(seq, k):
+					break
+			frames.append(frame)
+		return np.concatenate(frames, axis=1)
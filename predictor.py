@@ -0,0 +1,245 @@
+from __future__ import print_function
+import time, numpy as np
+
+def polynomialXVA(c, dt):
+	"""Turn the coefficients c of a prediction (see Predictor.getCoefficients) in place into the
+	position c[0], velocity c[1] and acceleration c[2] dt after the last sample, return c."""
+	c[0] += dt*(c[1] + dt*c[2])
+	c[1] += 2*dt*c[2]
+	c[2] *= 2
+	return c
+
+def polynomialAt(c, dt, out=None):
+	"""Evaluate the coefficients c of a prediction (see Predictor.getCoefficients) at an array of
+	times dt after the last sample. Return a len(dt) x sample shape array, written into out if given."""
+	dt = np.reshape(dt, (-1,) + (1,)*(c.ndim-1))
+	if out is None:
+		out = np.empty((len(dt),) + c.shape[1:])
+	np.multiply(c[2], dt, out=out)
+	out += c[1]
+	out *= dt
+	out += c[0]
+	return out
+
+class Predictor(object):
+	"""Base class for motion predictors.
+
+	Samples come from the stream thread with update(p, t), predictions are made on the
+	render thread with predict(t). Derived classes keep their state in preallocated arrays
+	of the sample shape, so both are O(1) and vectorized over all markers. The sequence
+	counter is odd while the state is updated (a seqlock, like ringbuffer.RingBuffer)."""
+	nReady = 3 # number of samples needed for a prediction
+	maxInterval = 0.02 # longest sample interval (s) the model extrapolates well, see Rtc3dClient.adaptDivisor
+
+	def __init__(self):
+		self.sequence = 0
+		self.n = 0        # number of samples
+		self.t = 0.0      # time of the last sample
+		self.shape = None # sample shape
+
+	def ready(self):
+		"Return True if enough samples arrived for a prediction."
+		return self.n >= self.nReady
+
+	def update(self, p, t):
+		"Add sample p (any shape) at time t."
+		if self.shape != np.shape(p):
+			self.shape = np.shape(p)
+			self.allocate(self.shape)
+			self.n = 0
+		self.sequence += 1 # odd: updating
+		if self.n == 0:
+			self.initialize(p)
+		elif t <= self.t:
+			# no time difference, only replace the value
+			self.replace(p)
+			t = self.t
+		else:
+			self.correct(p, t - self.t)
+		self.t = t
+		self.n += 1
+		self.sequence += 1 # even: done
+
+	def predict(self, t, out=None):
+		"Return the extrapolated sample at time t, written into out if given."
+		if out is None:
+			out = np.empty(self.shape)
+		while True:
+			seq = self.sequence
+			if seq & 1:
+				time.sleep(0) # let the writer finish
+				continue
+			self.extrapolate(t - self.t, out)
+			if self.sequence == seq:
+				return out
+
+	def shift(self, dt):
+		"Move the time base of the state dt, for instance when the server clock was reset."
+		self.sequence += 1
+		self.t += dt
+		self.shiftTime(dt)
+		self.sequence += 1
+
+	def getCoefficients(self, out=None):
+		"""Return (t, c): the prediction dt after the last sample time t is c[0] + c[1]*dt + c[2]*dt**2.
+		c (3 x sample shape) is written into out if given."""
+		if out is None:
+			out = np.empty((3,) + self.shape)
+		while True:
+			seq = self.sequence
+			if seq & 1:
+				time.sleep(0) # let the writer finish
+				continue
+			t = self.t
+			self.polynomial(out)
+			if self.sequence == seq:
+				return (t, out)
+
+	def predictTimes(self, times, out=None):
+		"""Return the extrapolated samples at an array of times (nTimes x sample shape) from one
+		consistent state, written into out if given."""
+		(tLast, c) = self.getCoefficients()
+		return polynomialAt(c, np.asarray(times, dtype=float) - tLast, out)
+
+	def predictXVA(self, t, out=None):
+		"""Return the extrapolated position, velocity and acceleration at time t as one array 
+		(3 x sample shape), written into out if given."""
+		(tLast, c) = self.getCoefficients(out)
+		return polynomialXVA(c, t - tLast)
+
+	# override these
+	def allocate(self, shape):
+		"Allocate the state arrays."
+		pass
+	def initialize(self, p):
+		"Set the state from the first sample."
+		pass
+	def replace(self, p):
+		"Handle a sample without time difference to the last one."
+		self.initialize(p)
+	def correct(self, p, dt):
+		"Update the state with sample p, dt after the last one."
+		pass
+	def extrapolate(self, dt, out):
+		"Write the prediction dt after the last sample into out."
+		pass
+	def polynomial(self, out):
+		"Write the coefficients of the prediction as a quadratic in dt into out[0], out[1] and out[2]."
+		pass
+	def shiftTime(self, dt):
+		"Move times in the state other than self.t dt."
+		pass
+
+class QuadraticPredictor(Predictor):
+	"""Quadratic through the last three samples, no filtering.
+
+	The Newton form p2 + (t-t2)*(c1 + (t-t1)*c2) is updated with every sample, so a
+	prediction costs four in place array operations, no fit."""
+	def allocate(self, shape):
+		self.t1 = 0.0             # time of the sample before the last
+		self.p2 = np.zeros(shape) # last sample
+		self.c1 = np.zeros(shape) # first divided difference (p2-p1)/(t2-t1)
+		self.c2 = np.zeros(shape) # second divided difference
+		self.d = np.zeros(shape)  # scratch
+	def initialize(self, p):
+		self.p2[...] = p
+	def replace(self, p):
+		self.p2[...] = p
+	def correct(self, p, dt):
+		np.subtract(p, self.p2, out=self.d)
+		self.d /= dt                 # new first difference
+		if self.n >= 2:
+			np.subtract(self.d, self.c1, out=self.c2)
+			self.c2 /= self.t + dt - self.t1
+		self.c1[...] = self.d
+		self.p2[...] = p
+		self.t1 = self.t
+	def extrapolate(self, dt, out):
+		np.multiply(self.c2, dt + self.t - self.t1, out=out)
+		out += self.c1
+		out *= dt
+		out += self.p2
+	def shiftTime(self, dt):
+		self.t1 += dt
+	def polynomial(self, out):
+		out[0] = self.p2
+		np.multiply(self.c2, self.t - self.t1, out=out[1])
+		out[1] += self.c1
+		out[2] = self.c2
+
+class KinematicPredictor(Predictor):
+	"""Base class for filters with position, velocity and acceleration state,
+	predicts x + v*dt + a*dt**2/2. Filters average over samples, so they want more of them."""
+	maxInterval = 0.01
+	def allocate(self, shape):
+		self.x = np.zeros(shape) # position
+		self.v = np.zeros(shape) # velocity
+		self.a = np.zeros(shape) # acceleration
+		self.r = np.zeros(shape) # residual
+		self.s = np.zeros(shape) # scratch
+	def initialize(self, p):
+		self.x[...] = p
+		self.v[...] = 0
+		self.a[...] = 0
+	def replace(self, p):
+		self.x[...] = p
+	def propagate(self, dt):
+		"Move the state dt ahead."
+		np.multiply(self.a, 0.5*dt, out=self.s)
+		self.s += self.v
+		self.s *= dt
+		self.x += self.s
+		np.multiply(self.a, dt, out=self.s)
+		self.v += self.s
+	def gain(self, p, k0, k1, k2):
+		"Correct the state with the residual of p using gains k0, k1 and k2."
+		np.subtract(p, self.x, out=self.r)
+		for (state, k) in ((self.x, k0), (self.v, k1), (self.a, k2)):
+			np.multiply(self.r, k, out=self.s)
+			state += self.s
+	def extrapolate(self, dt, out):
+		np.multiply(self.a, 0.5*dt, out=out)
+		out += self.v
+		out *= dt
+		out += self.x
+	def polynomial(self, out):
+		out[0] = self.x
+		out[1] = self.v
+		np.multiply(self.a, 0.5, out=out[2])
+
+class AlphaBetaGammaPredictor(KinematicPredictor):
+	"""Alpha-beta-gamma filter, fixed gains on the residual of each sample."""
+	def __init__(self, alpha=0.2, beta=0.02, gamma=0.001):
+		super(AlphaBetaGammaPredictor, self).__init__()
+		self.alpha = alpha
+		self.beta = beta
+		self.gamma = gamma
+	def correct(self, p, dt):
+		self.propagate(dt)
+		self.gain(p, self.alpha, self.beta/dt, 2*self.gamma/dt**2)
+
+class KalmanPredictor(KinematicPredictor):
+	"""Constant acceleration Kalman filter with white jerk process noise.
+
+	All markers and axes have the same sample times and noise model, so they share
+	one 3 x 3 covariance matrix and the gains are computed once per sample.
+	processNoise is the jerk spectral density (m**2/s**5), measurementNoise the
+	variance of a sample (m**2)."""
+	def __init__(self, processNoise=10.0, measurementNoise=1e-8):
+		super(KalmanPredictor, self).__init__()
+		self.processNoise = processNoise
+		self.measurementNoise = measurementNoise
+	def initialize(self, p):
+		super(KalmanPredictor, self).initialize(p)
+		self.P = np.diag([self.measurementNoise, 1.0, 100.0]) # covariance of x, v, a
+	def correct(self, p, dt):
+		self.propagate(dt)
+		F = np.array([[1, dt, 0.5*dt**2], [0, 1, dt], [0, 0, 1]])
+		Q = self.processNoise * np.array([
+			[dt**5/20, dt**4/8, dt**3/6],
+			[dt**4/8,  dt**3/3, dt**2/2],
+			[dt**3/6,  dt**2/2, dt]])
+		P = F.dot(self.P).dot(F.T) + Q
+		k = P[:,0] / (P[0,0] + self.measurementNoise)
+		self.P = P - np.outer(k, P[0,:])
+		self.gain(p, k[0], k[1], k[2])
@@ -0,0 +1,202 @@
+"""Run a tracker client in a child process, so its decoding does not compete with the
+render thread for the GIL. Python 3 only.
+
+	positionClient = processclient.ProcessClient(fpclient.FpClient)
+	positionClient.connect(server)
+	positionClient.startStream()
+	...
+	p = positionClient.getPosition(positionClient.time()+5./60)
+
+The child publishes its poses in shared memory (see sharedpose), getPosition and
+getPosition2 read them there without any interaction with the child. The other methods
+are sent to the child over a pipe.
+"""
+import os, time, threading, itertools, logging, multiprocessing, numpy as np
+import fpclient, sledclient, sharedpose
+try:
+	from concurrent.futures import Future
+except ImportError: # Python 2 without the futures backport
+	from rtc3dclient import Future
+
+def serve(ClientClass, clientArgs, name, conn, level=logging.WARNING):
+	"Child process: make the client and execute the calls that arrive on conn."
+	logging.basicConfig(level=level)
+	client = ClientClass(**clientArgs)
+	client.startPublishing(name)
+	lock = threading.Lock() # replies are sent by this thread and the stream thread
+	def reply(i, ok, value):
+		with lock:
+			conn.send((i, ok, value))
+	while True:
+		try:
+			(i, method, args, kwargs) = conn.recv()
+		except EOFError:
+			break # the parent is gone
+		try:
+			result = getattr(client, method)(*args, **kwargs)
+		except Exception as e:
+			reply(i, False, e)
+			continue
+		if isinstance(result, list) and result and all(isinstance(f, Future) for f in result):
+			# command futures: reply when all are done, exceptions are passed as values
+			def done(future, i=i, futures=result, remaining=[len(result)]):
+				with lock:
+					remaining[0] -= 1
+					last = remaining[0] == 0
+				if last:
+					reply(i, True, [f.exception() or f.result() for f in futures])
+			for future in result:
+				future.add_done_callback(done)
+		else:
+			reply(i, True, result)
+		if method == "close":
+			break
+	client.stopPublishing()
+
+class ProcessClient(object):
+	"""Tracker client of class ClientClass (with arguments clientArgs) in a child process,
+	with the query functions of rtc3dclient.Rtc3dClient."""
+	def __init__(self, ClientClass=fpclient.FpClient, name=None, **clientArgs):
+		if name is None:
+			name = "rudolph{}_{}".format(os.getpid(), id(self))
+		self.name = name
+		self.ClientClass = ClientClass
+		self.reader = None # sharedpose.PoseReader once the child published its first frame
+		self.profile = None # future of the last goto
+		self.futures = {}
+		self.count = itertools.count()
+		self.lock = threading.Lock()
+		context = multiprocessing.get_context("spawn") # no copy of the parent's threads (Qt, OpenGL)
+		(self.conn, childConn) = context.Pipe()
+		self.process = context.Process(target=serve, args=(ClientClass, clientArgs, name, childConn, logging.getLogger().level), name=ClientClass.__name__)
+		self.process.daemon = True
+		self.process.start()
+		self.thread = threading.Thread(target=self.replyThread)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def replyThread(self):
+		while True:
+			try:
+				(i, ok, value) = self.conn.recv()
+			except (EOFError, OSError):
+				break
+			future = self.futures.pop(i)
+			if ok:
+				future.set_result(value)
+			else:
+				future.set_exception(value)
+		for future in list(self.futures.values()):
+			future.set_exception(EOFError("{} process stopped".format(self.ClientClass.__name__)))
+
+	def call(self, method, *args, **kwargs):
+		"Call method of the client in the child, return a future of the result."
+		future = Future()
+		with self.lock:
+			i = next(self.count)
+			self.futures[i] = future
+			self.conn.send((i, method, args, kwargs))
+		return future
+
+	# methods executed by the child
+	def connect(self, host="localhost", port=None, timeout=5.0):
+		return self.call("connect", host, port).result(timeout)
+
+	def startStream(self):
+		return self.call("startStream").result()
+
+	def stopStream(self):
+		return self.call("stopStream").result()
+
+	def close(self, timeout=5.0):
+		try:
+			self.call("close").result(timeout)
+		except Exception as e:
+			logging.error("ERROR closing {} process: {}".format(self.ClientClass.__name__, e))
+		self.process.join(timeout)
+		if self.reader is not None:
+			self.reader.close()
+
+	def startRecording(self, fileName="", **kwargs):
+		return self.call("startRecording", fileName, **kwargs).result()
+
+	def stopRecording(self):
+		return self.call("stopRecording").result()
+
+	def getClock(self):
+		return self.call("getClock").result()
+
+	def command(self, *bodies):
+		"Like Rtc3dClient.command, without waiting for the child."
+		futures = [Future() for body in bodies]
+		def done(group):
+			try:
+				results = group.result()
+			except Exception as e:
+				results = [e]*len(futures)
+			for (future, result) in zip(futures, results):
+				if isinstance(result, Exception):
+					future.set_exception(result)
+				else:
+					future.set_result(result)
+		self.call("command", *bodies).add_done_callback(done)
+		return futures
+
+	def goto(self, dx, t=2.0):
+		"Like SledClient.goto, for a ProcessClient of a SledClient."
+		(setTable, self.profile) = self.command(*sledclient.profileCommands(dx, t))
+		return t
+
+	# query functions, read from shared memory
+	def time(self):
+		return time.time()
+
+	def ready(self):
+		return self.attach() and self.reader.ready()
+
+	def waitReady(self, timeout=None):
+		"Like Rtc3dClient.waitReady, polls the shared memory of the child."
+		tEnd = None if timeout is None else time.time() + timeout
+		while not self.ready():
+			if tEnd is not None and time.time() > tEnd:
+				return False
+			time.sleep(0.001)
+		return True
+
+	def attach(self):
+		"Return True if the shared memory block of the child exists."
+		if self.reader is None:
+			try:
+				self.reader = sharedpose.PoseReader(self.name, timeout=0)
+			except FileNotFoundError:
+				return False
+		return True
+
+	def getPositions(self, times, out=None):
+		"Like Rtc3dClient.getPositions."
+		if not self.attach():
+			logging.error("{} was not yet initialized when getPositions request was received".format(self.ClientClass.__name__))
+			return np.zeros((np.size(times), 1, 3))
+		return self.reader.getPositions(times, out)
+
+	def getXVA(self, t=None, dt=None):
+		"Like Rtc3dClient.getXVA, floats like SledClient.getXVA for a SledClient."
+		if not self.attach():
+			logging.error("{} was not yet initialized when getXVA request was received".format(self.ClientClass.__name__))
+			xva = (np.zeros((1, 3)),)*3
+		else:
+			xva = self.reader.getXVA(t, dt)
+		if issubclass(self.ClientClass, sledclient.SledClient):
+			return tuple(float(y[0,0]) for y in xva)
+		return xva
+
+	def getPosition(self, t=None, dt=None, out=None):
+		"Like Rtc3dClient.getPosition."
+		return self.getPosition2(t, dt, out)[0]
+
+	def getPosition2(self, t=None, dt=None, out=None):
+		"Like Rtc3dClient.getPosition2."
+		if not self.attach():
+			logging.error("{} was not yet initialized when getPosition request was received".format(self.ClientClass.__name__))
+			return [np.matrix([0,0,0]), 0]
+		return self.reader.getPosition2(t, dt, out)
@@ -0,0 +1,125 @@
+"""Record the raw package stream of a tracker client in memory mapped files.
+
+A session consists of two files: name.dat with the package contents back to back and
+name.idx with a header and one index record per package. Both are preallocated, the
+stream thread only copies into the memory maps, a background thread flushes them."""
+from __future__ import print_function
+import os, time, threading, logging, numpy as np
+
+headerType = np.dtype([('magic', 'S8'), ('n', '<u8'), ('size', '<u8'), ('capacity', '<u8')])
+indexType = np.dtype([
+	('frame', '<u4'),    # frame number
+	('type', '<u4'),     # package type
+	('tServer', '<f8'),  # server time (s)
+	('tArrival', '<f8'), # client arrival time (s)
+	('offset', '<u8'),   # start of the package content in the data file
+	('size', '<u8'),     # size of the package content
+	])
+magic = b"RTC3DLOG"
+
+def defaultFileName():
+	"Like utils.openLog: a time stamp, in directory log if it exists."
+	directory = ""
+	if os.path.isdir('log'):
+		directory = 'log/'
+	return "{}{}".format(directory, time.strftime('%Y-%m-%dT%H.%M.%S')) # MS Windows does not allow '-'
+
+class Recorder(object):
+	"""Append packages to a preallocated session of nPackage packages and nByte bytes
+	(the defaults hold two hours of 20 markers at 400 Hz). When it is full, further
+	packages are dropped with a warning."""
+	def __init__(self, fileName="", nPackage=3000000, nByte=1<<30, flushInterval=1.0):
+		if fileName == "":
+			fileName = defaultFileName()
+		self.fileName = fileName
+		self.data = np.memmap(fileName+".dat", dtype=np.uint8, mode='w+', shape=(nByte,))
+		self.index = np.memmap(fileName+".idx", dtype=np.uint8, mode='w+',
+			shape=(headerType.itemsize + nPackage*indexType.itemsize,))
+		self.header = self.index[:headerType.itemsize].view(headerType)[0]
+		self.records = self.index[headerType.itemsize:].view(indexType)
+		self.header['magic'] = magic
+		self.header['capacity'] = nPackage
+		self.n = 0    # number of packages
+		self.size = 0 # number of bytes
+		self.full = False
+		self.recording = True
+		self.flushInterval = flushInterval
+		self.thread = threading.Thread(target=self.flushThread)
+		self.thread.daemon = True
+		self.thread.start()
+		logging.info("recording to {}.dat".format(fileName))
+
+	def record(self, pType, pContent, frame, tServer, tArrival):
+		"Append a package, only copies into memory."
+		size = len(pContent)
+		if self.n >= len(self.records) or self.size + size > len(self.data):
+			if not self.full:
+				logging.warning("recording {} is full, dropping packages".format(self.fileName))
+				self.full = True
+			return
+		self.data[self.size:self.size+size] = np.frombuffer(pContent, dtype=np.uint8)
+		record = self.records[self.n]
+		record['frame'] = frame
+		record['type'] = pType
+		record['tServer'] = tServer
+		record['tArrival'] = tArrival
+		record['offset'] = self.size
+		record['size'] = size
+		self.size += size
+		self.n += 1
+		# the header is written last, a reader never sees an incomplete package
+		self.header['size'] = self.size
+		self.header['n'] = self.n
+
+	def flushThread(self):
+		while self.recording:
+			time.sleep(self.flushInterval)
+			self.flush()
+
+	def flush(self):
+		self.data.flush()
+		self.index.flush()
+
+	def close(self):
+		"Stop recording and flush."
+		self.recording = False
+		self.thread.join()
+		self.flush()
+		logging.info("recorded {} packages, {} bytes to {}.dat".format(self.n, self.size, self.fileName))
+
+class Recording(object):
+	"""Read a session written by Recorder, also while it is being recorded."""
+	def __init__(self, fileName):
+		self.fileName = fileName
+		self.data = np.memmap(fileName+".dat", dtype=np.uint8, mode='r')
+		index = np.memmap(fileName+".idx", dtype=np.uint8, mode='r')
+		self.header = index[:headerType.itemsize].view(headerType)[0]
+		if self.header['magic'] != magic:
+			raise IOError("{}.idx is not a recorded session".format(fileName))
+		self.allRecords = index[headerType.itemsize:].view(indexType)
+
+	def __len__(self):
+		return int(self.header['n'])
+
+	@property
+	def records(self):
+		"Index records of all complete packages."
+		return self.allRecords[:len(self)]
+
+	def find(self, t, key='tArrival'):
+		"Return the number of the first package at or after time t (s), O(log n)."
+		return int(np.searchsorted(self.records[key], t))
+
+	def package(self, i):
+		"Return (pType, pContent, frame, tServer, tArrival) of package i, pContent is a view."
+		record = self.allRecords[i]
+		offset = int(record['offset'])
+		pContent = memoryview(self.data[offset:offset+int(record['size'])])
+		return (int(record['type']), pContent, int(record['frame']), float(record['tServer']), float(record['tArrival']))
+
+	def packages(self, tStart=None, tEnd=None, key='tArrival'):
+		"Iterate over packages between tStart and tEnd."
+		i0 = 0 if tStart is None else self.find(tStart, key)
+		i1 = len(self) if tEnd is None else self.find(tEnd, key)
+		for i in range(i0, i1):
+			yield self.package(i)
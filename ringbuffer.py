@@ -0,0 +1,79 @@
+from __future__ import print_function
+import logging, time, numpy as np
+
+class RingBuffer(object):
+	"""Fixed capacity history of marker positions with server and arrival times.
+
+	There is one writer (the stream thread) and any number of readers. Every sample is
+	stored twice, at i and i+capacity, so the last k samples are always a contiguous slice
+	and can be handed out as views. The sequence counter is even when idle and odd while
+	a sample is written (a seqlock). A reader takes the sequence with begin(), uses the
+	views and checks with retry() whether the writer came round to the slots it used:
+
+		while True:
+			seq = history.begin()
+			p, t, ta = history.last(3)
+			... use p, t and ta ...
+			if not history.retry(seq, 3):
+				break
+	"""
+	width = (3,) # values per marker
+
+	def __init__(self, capacity=1024, nMarker=None):
+		self.capacity = capacity
+		self.sequence = 0 # 2*n when idle, 2*n+1 while writing sample n
+		self.n = 0        # number of samples written
+		self.t = np.zeros(2*capacity)  # server time converted to client time (s)
+		self.ta = np.zeros(2*capacity) # arrival time (s)
+		self.p = None
+		if nMarker is not None:
+			self.allocate(nMarker)
+
+	def allocate(self, nMarker):
+		"Allocate position storage for nMarker markers, this clears the history."
+		if self.p is not None:
+			logging.warning("number of markers changed from {} to {}, clearing history".format(self.p.shape[1], nMarker))
+		self.sequence += 1
+		self.p = np.zeros((2*self.capacity, nMarker) + self.width) # time x markers x xyz (m)
+		self.n = 0
+		self.sequence += 1
+
+	def __len__(self):
+		return min(self.n, self.capacity)
+
+	def append(self, p, t, ta):
+		"Add marker positions p (nMarker x 3) with server time t and arrival time ta."
+		if self.p is None or self.p.shape[1] != len(p):
+			self.allocate(len(p))
+		i = self.n % self.capacity
+		self.sequence += 1 # odd: writing
+		self.p[i] = p
+		self.p[i+self.capacity] = p
+		self.t[i] = self.t[i+self.capacity] = t
+		self.ta[i] = self.ta[i+self.capacity] = ta
+		self.n += 1
+		self.sequence += 1 # even: done
+
+	def begin(self):
+		"Return the sequence number to pass to retry(), waits for a write in progress."
+		seq = self.sequence
+		while seq & 1:
+			time.sleep(0) # let the writer finish
+			seq = self.sequence
+		return seq
+
+	def retry(self, seq, k=1):
+		"Return True if a reader that used the last k samples since begin() must read again."
+		return self.sequence - seq > 2*(self.capacity - k)
+
+	def last(self, k=1):
+		"Return views (p, t, ta) on the last k samples, oldest first, empty before the first sample."
+		if self.p is None:
+			return (np.zeros((0, 0) + self.width), self.t[:0], self.ta[:0])
+		j = (self.n - 1) % self.capacity + self.capacity + 1
+		return (self.p[j-k:j], self.t[j-k:j], self.ta[j-k:j])
+
+class ChannelBuffer(RingBuffer):
+	"""Like RingBuffer, for one value per channel per sample, for instance analog channels (V).
+	p is time x channels, append takes an array of nChannel values."""
+	width = ()
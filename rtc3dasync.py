@@ -0,0 +1,156 @@
+"""Run any number of RTC3D connections (sled, head tracker, other trackers) on one asyncio
+event loop in one thread, instead of one blocking stream thread per client. Python 3 only.
+
+	loop = rtc3dasync.StreamLoop()
+	sledClient = sledclient.SledClient()
+	loop.connect(sledClient, server, 3375)
+	positionClient = fpclient.FpClient()
+	loop.connect(positionClient, server, 3020)
+	...
+	loop.stop()
+
+The clients keep their query functions; packages are handed to their handlePackage.
+"""
+import asyncio, logging, socket, threading
+from rtc3dclient import FrameReader
+
+class Rtc3dProtocol(asyncio.BufferedProtocol):
+	"""RTC3D framing on an asyncio connection. The transport writes directly into a
+	FrameReader buffer. The protocol stands in for the socket (sendall, close) and
+	the stream thread (isAlive, join) of its client, so the client code is unchanged.
+	A lost connection is made again by streamLoop if the client has reconnect set, the
+	protocol stays alive until then."""
+	def __init__(self, client, streamLoop):
+		self.client = client
+		self.streamLoop = streamLoop
+		self.loop = streamLoop.loop
+		self.reader = FrameReader()
+		self.transport = None
+		self.closing = False # closed by the client
+		self.closed = threading.Event()
+
+	# asyncio.BufferedProtocol
+	def connection_made(self, transport):
+		self.transport = transport
+		self.client.thread = self
+		self.client.stoppingStream = False
+		with self.client.commandLock: # commands of other threads go after the startup commands
+			self.client.sock = self
+			self.client.startFrames()
+
+	def get_buffer(self, sizehint):
+		return self.reader.space()
+
+	def buffer_updated(self, nbytes):
+		self.reader.received(nbytes)
+		while True:
+			package = self.reader.pop()
+			if package is None:
+				break
+			(pType, pContent) = package
+			if pType != 3:
+				pContent = pContent.tobytes() # responses are small and may be kept
+			self.client.handlePackage(pType, pContent, self.reader.peek() == 3)
+		if self.client.stoppingStream:
+			self.client.sendCommand("Bye")
+			self.transport.close()
+
+	def connection_lost(self, exc):
+		if exc is not None:
+			logging.error("ERROR connection to {} lost: {}".format(type(self.client).__name__, exc))
+		self.client.connected = False
+		self.client.failCommands(exc or "connection closed")
+		if self.client.reconnect and not self.client.stoppingStream and not self.closing:
+			asyncio.ensure_future(self.streamLoop.reconnect(self), loop=self.loop)
+			return
+		self.client.stoppingStream = False
+		self.closed.set()
+
+	# socket interface for the client, may be called from any thread
+	def sendall(self, data):
+		if threading.current_thread() is self.streamLoop.thread:
+			self.transport.write(bytes(data)) # now, a close that follows flushes it
+		else:
+			self.loop.call_soon_threadsafe(self.transport.write, bytes(data))
+
+	def close(self):
+		self.closing = True
+		if self.isAlive():
+			self.loop.call_soon_threadsafe(self.transport.close)
+
+	# thread interface for the client
+	def isAlive(self):
+		return not self.closed.is_set()
+	is_alive = isAlive
+
+	def join(self, timeout=None):
+		self.closed.wait(timeout)
+
+class StreamLoop(object):
+	"Event loop thread that serves the connections of any number of clients."
+	def __init__(self):
+		self.loop = asyncio.new_event_loop()
+		self.protocols = []
+		self.thread = threading.Thread(target=self.run, name="StreamLoop")
+		self.thread.daemon = True
+		self.thread.start()
+
+	def run(self):
+		asyncio.set_event_loop(self.loop)
+		self.loop.run_forever()
+		self.loop.close()
+
+	def connect(self, client, host="localhost", port=None, timeout=3):
+		"""Connect client (an FpClient or SledClient) to host and start streaming.
+		Blocks until the connection is made and returns its protocol."""
+		if port is None:
+			port = client.port
+		client.host = host
+		client.port = port
+		future = asyncio.run_coroutine_threadsafe(self.open(client, host, port), self.loop)
+		try:
+			protocol = future.result(timeout)
+		except Exception as e:
+			future.cancel()
+			logging.error("ERROR connecting to {}:{}: {}".format(host, port, e))
+			raise
+		self.protocols.append(protocol)
+		return protocol
+
+	async def open(self, client, host, port):
+		(transport, protocol) = await self.loop.create_connection(lambda: Rtc3dProtocol(client, self), host, port)
+		transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		client.connected = True
+		return protocol
+
+	async def reconnect(self, old):
+		"""Connect the client of protocol old again with bounded exponential backoff, like
+		Rtc3dClient.reconnectSocket, until it succeeds or the client stops the stream."""
+		client = old.client
+		logging.warning("connection to {}:{} lost, reconnecting".format(client.host, client.port))
+		delay = client.minBackoff
+		while not client.stoppingStream:
+			try:
+				protocol = await self.open(client, client.host, client.port)
+			except OSError:
+				await asyncio.sleep(delay)
+				delay = min(2*delay, client.maxBackoff)
+				continue
+			client.clockBefore = client.clock.estimate
+			client.clock.restart()
+			self.protocols[self.protocols.index(old)] = protocol
+			logging.info("reconnected to {}:{}".format(client.host, client.port))
+			break
+		client.stoppingStream = False
+		old.closed.set()
+
+	def stop(self, timeout=3):
+		"Say Bye on all connections and stop the loop thread."
+		for protocol in self.protocols:
+			protocol.client.stopStream()
+		for protocol in self.protocols:
+			protocol.join(timeout)
+			if protocol.isAlive():
+				protocol.close() # no package arrived to say Bye with
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join(timeout)
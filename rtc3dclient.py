@@ -0,0 +1,976 @@
+#!/usr/bin/python
+"""Protocol core shared by FpClient and SledClient: package framing, the data package
+decoders and the streaming client (history, clock estimate, prediction)."""
+from __future__ import print_function
+import socket, sys, binascii, struct, time, threading, logging, collections, numpy as np
+import ringbuffer, predictor, clocksync, recorder, latency
+try:
+	import queue
+except ImportError: # Python 2
+	import Queue as queue
+try:
+	from concurrent.futures import Future
+except ImportError: # Python 2 without the futures backport
+	Future = None
+python2 = sys.version_info[0] < 3
+clock = getattr(time, "perf_counter", None) or time.clock # highest resolution timer, time.clock before Python 3.3
+
+# RTC3D data layout, big endian (see SetByteOrder in startThread)
+packageHeader = struct.Struct(">II")       # package size (including header), package type
+componentHeader = struct.Struct(">IIIQ")   # component size (including header), type, frame, time (us)
+countStruct = struct.Struct(">I")          # item count at the start of a component
+timespecStruct = struct.Struct("@ll")    # kernel time stamp, seconds and nanoseconds
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35) # Linux
+marker3DType = np.dtype([('x', '>f4'), ('y', '>f4'), ('z', '>f4'), ('delta', '>f4')])
+
+def decodeCounted(content, pointer, end, dtype, width=None):
+	"""Decode a component body of an item count followed by the items as a view on content.
+	Return an array of count items, of width values each if width is given."""
+	count = countStruct.unpack_from(content, pointer)[0]
+	n = (end - pointer - 4) // np.dtype(dtype).itemsize
+	if width is None:
+		width = n // count if count else 1
+	values = np.frombuffer(content, dtype=dtype, count=count*width, offset=pointer+4)
+	return values.reshape(count, width)
+
+def decode3DComponent(content, pointer, end):
+	"Markers as n x 4 (x, y, z, delta in mm)."
+	count = countStruct.unpack_from(content, pointer)[0]
+	m = np.frombuffer(content, dtype=marker3DType, count=count, offset=pointer+4)
+	return m.view('>f4').reshape(count, 4)
+
+def decodeAnalogComponent(content, pointer, end):
+	"Channels in V."
+	return decodeCounted(content, pointer, end, '>f4', 1)[:,0]
+
+def decodeForceComponent(content, pointer, end):
+	"One row of values per force plate."
+	return decodeCounted(content, pointer, end, '>f4')
+
+def decode6DComponent(content, pointer, end):
+	"One row per tool: q0, qx, qy, qz, x, y, z, error."
+	return decodeCounted(content, pointer, end, '>f4')
+
+def quaternionProducts():
+	"""Return the 16 x 9 matrix that maps the products q[i]*q[j] of a quaternion (q0, qx, qy, qz) 
+	to its rotation matrix times the squared norm."""
+	m = np.zeros((4, 4, 3, 3))
+	(w, x, y, z) = range(4)
+	for (i, j, r, c, f) in [
+			(w,w,0,0,1), (x,x,0,0,1), (y,y,0,0,-1), (z,z,0,0,-1),
+			(w,w,1,1,1), (x,x,1,1,-1), (y,y,1,1,1), (z,z,1,1,-1),
+			(w,w,2,2,1), (x,x,2,2,-1), (y,y,2,2,-1), (z,z,2,2,1),
+			(x,y,0,1,2), (w,z,0,1,-2), (x,z,0,2,2), (w,y,0,2,2),
+			(x,y,1,0,2), (w,z,1,0,2), (y,z,1,2,2), (w,x,1,2,-2),
+			(x,z,2,0,2), (w,y,2,0,-2), (y,z,2,1,2), (w,x,2,1,2)]:
+		m[i,j,r,c] = f
+	return m.reshape(16, 9)
+quaternionMatrix = quaternionProducts()
+
+def quaternionsToMatrices(q, out=None):
+	"""Convert n quaternions (n x 4: q0, qx, qy, qz, any norm) to rotation matrices (n x 3 x 3) 
+	with one outer product and one matrix product. R.dot(v) rotates v from tool to tracker 
+	coordinates."""
+	q = np.asarray(q, dtype=float)
+	products = (q[:,:,None]*q[:,None,:]).reshape(len(q), 16)
+	r = products.dot(quaternionMatrix)
+	r /= products[:,::5].sum(axis=1)[:,None] # squared norm
+	r = r.reshape(len(q), 3, 3)
+	if out is None:
+		return r
+	out[...] = r
+	return out
+
+def decodeEventComponent(content, pointer, end):
+	"One row of 32 bit words per event."
+	return decodeCounted(content, pointer, end, '>u4')
+
+# component type: decoder(content, pointer to the component body, end of the component)
+decoders = {
+	1: decode3DComponent,
+	2: decodeAnalogComponent,
+	3: decodeForceComponent,
+	4: decode6DComponent,
+	5: decodeEventComponent,
+	}
+
+def registerDecoder(cType, decoder):
+	"Use decoder(content, pointer, end) for components of type cType."
+	decoders[cType] = decoder
+
+def decodePackage(content, cTypes=None):
+	"""Decode a data package in one pass. Return (components, frame, time): components maps
+	component type to its decoded data (views on content), frame is the frame number and time 
+	the server time in s. Only types in cTypes are decoded if it is given."""
+	cCount = countStruct.unpack_from(content, 0)[0]
+	pointer = 4
+	components = {}
+	cFrame = 0
+	cTime = 0
+	for i in range(cCount):
+		(cSize, cType, cFrame, cTime) = componentHeader.unpack_from(content, pointer)
+		if cType in decoders and (cTypes is None or cType in cTypes):
+			data = decoders[cType](content, pointer+20, pointer+cSize)
+			if cType in components:
+				# only copies if there is more than one component of a type
+				data = np.concatenate([components[cType], data])
+			components[cType] = data
+		pointer += cSize
+	return (components, cFrame, cTime*1e-6)
+
+def packageTime(content):
+	"Return (frame, time in s) of a data package from its first component header, without decoding."
+	if countStruct.unpack_from(content, 0)[0] == 0:
+		return (0, 0.0)
+	(cSize, cType, cFrame, cTime) = componentHeader.unpack_from(content, 4)
+	return (cFrame, cTime*1e-6)
+
+def decode3D(content):
+	"""Decode the 3D components of a data package without per marker python work.
+	Return (markers, frame, time) where markers is an n x 4 array (x, y, z, delta in mm) 
+	that is a view on the package bytes, frame the frame number and time the server time in s."""
+	(components, frame, t) = decodePackage(content, (1,))
+	markers = components.get(1)
+	if markers is None:
+		markers = np.empty((0, 4), dtype='>f4')
+	return (markers, frame, t)
+
+class FrameReader(object):
+	"""Read length prefixed packages from a socket into one preallocated buffer.
+	Each recv_into takes everything the socket has queued, so a burst of packages costs one 
+	system call. Package contents are returned as memoryviews on the buffer (buffer objects 
+	in Python 2, where numpy cannot read memoryviews), they are only valid until more data 
+	is received. Without a socket, received data is written into space() and reported with 
+	received(), see rtc3dasync."""
+	header = packageHeader
+	
+	def __init__(self, sock=None, size=1<<16):
+		self.sock = sock
+		self.buffer = bytearray(size)
+		self.view = memoryview(self.buffer)
+		self.start = 0 # first unread byte
+		self.end = 0   # end of received bytes
+		self.pSize = 8 # size of the first incomplete package (as far as known)
+		self.timestamps = False
+		self.tReceived = 0.0 # kernel receive time of the last fill (s), see enableTimestamps
+		
+	def enableTimestamps(self):
+		"""Let fill take the kernel receive time (SO_TIMESTAMPNS, Linux only) into tReceived. 
+		For TCP this is the time of the last segment a fill copied. One fill takes everything
+		the socket has queued, so all packages of a burst that is read at once get the time of 
+		the last one. The earlier ones arrived before it, so their network delay is 
+		overestimated and their queueing delay underestimated (see latency). Return False if 
+		this is not available."""
+		if not sys.platform.startswith("linux") or not hasattr(self.sock, "recvmsg_into"):
+			return False
+		self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+		self.ancSize = socket.CMSG_SPACE(timespecStruct.size)
+		self.timestamps = True
+		return True
+		
+	def available(self):
+		"Return the number of received bytes that were not yet read."
+		return self.end - self.start
+		
+	def read(self):
+		"Return (pType, pContent) of the next package, blocks until it is complete."
+		while True:
+			package = self.pop()
+			if package is not None:
+				return package
+			self.fill()
+			
+	def peek(self):
+		"Return the type of the next package if it is complete, else None. Nothing is read."
+		n = self.end - self.start
+		if n >= 8:
+			(pSize, pType) = self.header.unpack_from(self.buffer, self.start)
+			if n >= pSize:
+				return pType
+		return None
+
+	def pop(self):
+		"Return (pType, pContent) of the next package or None if it is incomplete."
+		n = self.end - self.start
+		self.pSize = 8
+		if n >= 8:
+			(pSize, pType) = self.header.unpack_from(self.buffer, self.start)
+			if pSize < 8:
+				raise IOError("illegal package size: {}".format(pSize))
+			if n >= pSize:
+				if python2:
+					pContent = buffer(self.buffer, self.start+8, pSize-8)
+				else:
+					pContent = self.view[self.start+8:self.start+pSize]
+				self.start += pSize
+				return (pType, pContent)
+			self.pSize = pSize
+		return None
+			
+	def space(self):
+		"Return a view on the free end of the buffer, with room for the incomplete package."
+		if self.start == self.end:
+			self.start = self.end = 0
+		elif len(self.buffer) - self.start < self.pSize or self.start > len(self.buffer)//2:
+			# move the incomplete package to the front
+			n = self.end - self.start
+			self.view[0:n] = self.view[self.start:self.end].tobytes() # copy, the ranges may overlap
+			self.start = 0
+			self.end = n
+		if len(self.buffer) < self.pSize:
+			# cannot resize in place while package views exist
+			logging.info("growing receive buffer to {} bytes".format(2*self.pSize))
+			buffer = bytearray(2*self.pSize)
+			buffer[0:self.end] = self.view[0:self.end]
+			self.buffer = buffer
+			self.view = memoryview(self.buffer)
+		return self.view[self.end:]
+		
+	def received(self, n):
+		"Account for n bytes written into space()."
+		self.end += n
+			
+	def fill(self):
+		"Receive at least one byte."
+		if self.timestamps:
+			(nReceived, ancData, flags, address) = self.sock.recvmsg_into([self.space()], self.ancSize)
+			for (level, cType, data) in ancData:
+				if level == socket.SOL_SOCKET and cType == SO_TIMESTAMPNS:
+					(sec, nsec) = timespecStruct.unpack_from(data)
+					self.tReceived = sec + 1e-9*nsec
+		else:
+			nReceived = self.sock.recv_into(self.space())
+		if nReceived == 0:
+			raise socket.error("connection closed by server")
+		self.received(nReceived)
+
+if Future is None:
+	class Future(object):
+		"The part of concurrent.futures.Future that the clients use, for Python 2."
+		def __init__(self):
+			self.condition = threading.Condition()
+			self.state = None # 'result' or 'exception' once done
+			self.value = None
+			self.callbacks = []
+
+		def done(self):
+			return self.state is not None
+
+		def set_result(self, result):
+			self.finish('result', result)
+
+		def set_exception(self, exception):
+			self.finish('exception', exception)
+
+		def finish(self, state, value):
+			with self.condition:
+				(self.state, self.value) = (state, value)
+				(callbacks, self.callbacks) = (self.callbacks, [])
+				self.condition.notify_all()
+			for callback in callbacks:
+				callback(self)
+
+		def add_done_callback(self, fn):
+			with self.condition:
+				if self.state is None:
+					self.callbacks.append(fn)
+					return
+			fn(self)
+
+		def wait(self, timeout):
+			tEnd = None if timeout is None else time.time() + timeout
+			with self.condition:
+				while self.state is None:
+					if tEnd is not None and time.time() >= tEnd:
+						raise socket.timeout("no result within {} s".format(timeout))
+					self.condition.wait(None if tEnd is None else tEnd - time.time())
+
+		def result(self, timeout=None):
+			self.wait(timeout)
+			if self.state == 'exception':
+				raise self.value
+			return self.value
+
+		def exception(self, timeout=None):
+			self.wait(timeout)
+			return self.value if self.state == 'exception' else None
+
+class CommandFuture(Future):
+	"""Future of a command sent with Rtc3dClient.command. The result is the response text,
+	an error response raises IOError. rtt is the round trip time (s) once it is done."""
+	def __init__(self, body):
+		super(CommandFuture, self).__init__()
+		self.body = body
+		self.tSent = 0.0
+		self.rtt = None
+
+class Rtc3dClient(object):
+	"""Streaming client for the RTC3D protocol of NDI First Principles and the sled server.
+	A background thread (or an rtc3dasync.StreamLoop) decodes the data packages into a 
+	ring buffer and a predictor that are queried with getPosition."""
+	## package and component types
+	pTypes = ['Error', 'Command', 'XML', 'Data', 'Nodata', 'C3D']
+	cTypes = ['', '3D', 'Analog', 'Force', '6D', 'Event']
+	
+	port = 3020 # default server port
+	
+	def __init__(self, verbose=0, nBuffer=3, nHistory=4096, PredictorClass=predictor.QuadraticPredictor, useServerTime=True,
+			adaptiveDivisor=False, latestOnly=False, kernelTimestamps=False, reconnect=True):
+		# 1 verbose, 2: very verbose
+		self.verbose = verbose 
+		# number of buffered marker coordinate set 
+		if nBuffer >= 3:
+			self.nBuffer = nBuffer
+		else:
+			logging.warning("illegal number for nBuffer: {}, using nBuffer=3".format(nBuffer))
+			self.nBuffer = 3
+		# marker positions, server and arrival times of the last nHistory frames
+		self.history = ringbuffer.RingBuffer(max(nHistory, self.nBuffer))
+		# analog channels (V) of the last nHistory frames, see getAnalog
+		self.analog = ringbuffer.ChannelBuffer(nHistory)
+		# event components go to the callbacks of addEventCallback, called from eventThread
+		self.eventCallbacks = []
+		self.events = getattr(queue, "SimpleQueue", queue.Queue)() # SimpleQueue since Python 3.7
+		self.eventThread = None
+		# motion model used by getPosition, for instance predictor.KalmanPredictor to reduce noise
+		self.predictor = PredictorClass()
+		# set once the predictor and the clock estimate can be used, see waitReady
+		self.readyEvent = threading.Event()
+		# indices of the 3D markers that are decoded, None for all, see subscribe
+		self.subscription = None
+		self.bodies = {} # name: marker indices, see defineBody
+		# number of 3D markers and 6D tools in the last frame, see stack
+		self.nMarker = 0
+		self.nTool = 0
+		# offset and drift of the server clock, see getClock
+		self.clock = clocksync.ClockEstimator()
+		# predict with server times (no network jitter) or with arrival times
+		self.useServerTime = useServerTime
+		# raw data packages are recorded if this is a recorder.Recorder, see startRecording
+		self.recorder = None
+		# FrequencyDivisor of the stream. With adaptiveDivisor it follows the rate of getPosition 
+		# calls and the sample interval the predictor needs, see adaptDivisor
+		self.divisor = 1
+		self.adaptiveDivisor = adaptiveDivisor
+		self.maxDivisor = 100
+		self.queryOversampling = 2.0 # samples per query
+		self.adaptInterval = 1.0     # s
+		self.nQuery = 0              # number of getPosition(2), getPositions and getXVA calls
+		self.tAdapt = 0.0
+		self.nAdaptPackage = 0
+		self.nAdaptQuery = 0
+		# only decode the newest of the data packages that arrived together, the others 
+		# are only recorded
+		self.latestOnly = latestOnly
+		self.nSkipped = 0
+		# arrival times from the kernel instead of from this process after the socket read, 
+		# which includes waiting for the GIL and the scheduler
+		self.kernelTimestamps = kernelTimestamps
+		# a latency.LatencyStats if delays are measured, see measureLatency
+		self.latency = None
+		# a sharedpose.PosePublisher if poses are published for other processes, see startPublishing
+		self.publisher = None
+		self.publishLock = threading.Lock() # publish in the stream thread, close in stopPublishing
+		# commands waiting for their response, oldest first, see command
+		self.pending = collections.deque()
+		self.commandLock = threading.RLock() # also held while the startup commands are sent
+		# when the connection is lost, connect again with backoff (s) doubling from minBackoff
+		# to maxBackoff, keeping history and predictor. connected is False in between.
+		self.reconnect = reconnect
+		self.minBackoff = 0.01
+		self.maxBackoff = 1.0
+		self.connected = False
+		# while the connection is down, or when the last sample is more than maxExtrapolation s
+		# before the query time, the query functions hold the last sample, see predictorTime
+		self.maxExtrapolation = 0.25
+		self.holding = False
+		# server clock jump (s) after a reconnect above which the predictor is shifted
+		self.resyncThreshold = 0.1
+		self.clockBefore = None # clock estimate before a reconnect
+		self.sock = 0
+		self.thread = None
+		self.stoppingStream = False;
+		self.win32TimerOffset = time.time() - clock()
+	
+	def __del__(self):
+		self.close()
+	
+	# low level communication functions
+	def connect(self, host="localhost", port=None):
+		if port is None:
+			port = self.port
+		self.host = host
+		self.port = port
+		try:
+			self.openSocket(host, port)
+		except Exception as e:
+			logging.error("ERROR connecting to FP Server: "+str(e))
+			raise
+
+	def openSocket(self, host, port):
+		"Connect the socket without logging failures, see connect."
+		# Create a socket (SOCK_STREAM means a TCP socket)
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		# socket without nagling
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		# Connect to server and send data
+		self.sock.settimeout(3)
+		self.sock.connect((host, port))
+		self.reader = FrameReader(self.sock)
+		self.connected = True
+		if self.kernelTimestamps and not self.reader.enableTimestamps():
+			logging.warning("kernel time stamps are not available, using arrival times from time()")
+			self.kernelTimestamps = False
+
+	def send(self, body, pType):
+		#type  0: error, 1: command, 2: xml, 3: data, 4 nodata, 5: c3d
+		# pack length and type as 32 bit big endian.
+		if not isinstance(body, bytes):
+			body = body.encode() # python 3 str
+		head = packageHeader.pack(len(body)+8, pType)
+		if self.verbose:
+			print("Sent: Body ({}): #{}#".format(len(body), body))
+			#print "Sent: Body ({}): #{}#".format(len(body), binascii.hexlify(body))
+		try:
+			self.sock.sendall(head+body)
+		except Exception as e:
+			logging.error("ERROR sending to FP server: {}".format(e))
+			raise
+
+	def sendHandshake(self):
+		head = struct.pack(">I", 0) + struct.pack("BBBB", 1,3,3,6)
+			
+	def sendCommand(self, body):
+		self.send(body, 1)
+		
+	def command(self, *bodies):
+		"""Send commands in one write and return a CommandFuture per command, in order.
+		Does not wait for the responses, they are matched in the stream thread. The server
+		answers commands in order, so the oldest pending command gets the next response.
+		Use this instead of sendCommand once the stream runs."""
+		futures = []
+		packages = []
+		for body in bodies:
+			futures.append(CommandFuture(body))
+			if not isinstance(body, bytes):
+				body = body.encode() # python 3 str
+			packages.append(packageHeader.pack(len(body)+8, 1) + body)
+		with self.commandLock: # the order of pending must be the order on the wire
+			t = self.time()
+			for future in futures:
+				future.tSent = t
+			self.pending.extend(futures)
+			try:
+				self.sock.sendall(b"".join(packages))
+			except Exception as e:
+				logging.error("ERROR sending to FP server: {}".format(e))
+				self.failCommands(e)
+				raise
+		return futures
+		
+	def failCommands(self, reason):
+		"Fail all pending commands, for instance when the connection is closed."
+		while self.pending:
+			future = self.pending.popleft()
+			if not future.done():
+				future.set_exception(socket.error("no response to {}: {}".format(future.body, reason)))
+		
+	def sendXml(self, body):
+		self.send(body, 2)
+
+	def receive(self):
+		# set pSize, pType and pContent
+		try:
+			# pContent is a view on the receive buffer, valid until the next receive
+			(self.pType, self.pContent) = self.reader.read()
+			self.pSize = len(self.pContent)+8 # package size in bytes
+			if self.verbose>1:
+				print ("Received ({}, {}): ".format(self.pSize, self.pTypes[self.pType]))
+			if self.pType != 3:
+				self.pContent = bytes(self.pContent) # responses are small and may be kept
+			return self.pType
+		except Exception as e:
+			if not self.stoppingStream:
+				logging.error("ERROR receiving from FP server: {}".format(e))
+			raise
+			
+	def show(self):
+		"Show last received package. uses: pType and pContent"
+		print("Received: {} ({})".format(self.pTypes[self.pType], self.pType))
+		if self.pType in [0,1]: # error or command
+			print("  Command: #{}#".format(self.pContent))
+			#print "  Received: #{}#".format(binascii.hexlify(self.pContent))
+		elif self.pType in [3]: # data
+			(components, frame, t) = decodePackage(self.pContent)
+			print("  frame: {}, time: {} s".format(frame, t))
+			for (cType, data) in components.items():
+				print("  {} ({}):\n{}".format(self.cTypes[cType], cType, data))
+			print("  Received data: #{}#".format(binascii.hexlify(self.pContent)))
+		else:
+			print("  Other {}".format(self.pContent))
+			print("  Received: #{}#".format(binascii.hexlify(self.pContent)))
+			
+	def close(self):
+		print("Closing {}".format(type(self).__name__)) # cannot use logging lib logging object may not exist anymore
+		self.stopStream()
+		if self.thread is not None:
+			self.thread.join() #wait for other thread to die
+		if self.sock:
+			self.sock.close()
+		
+	def parse3D(self):
+		"Parse 3D data components in the last received package, "
+		"return them as n x 3 array and an "
+		if self.pType == 3: # data
+			(markers, self.frame, tServer) = decode3D(self.pContent)
+			return (np.asmatrix(np.multiply(markers[:,:3], 1e-3, dtype=float)), tServer)
+		else:
+			logging.error("expected 3d data but got packageType: {}".format(self.pType))
+			if self.pType==1:
+				logging.info("  package: ", self.pContent)
+			return np.matrix([])
+			
+	def time(self):
+		if sys.platform == "win32":
+			# on Windows, the highest resolution timer is clock() (time.perf_counter)
+			# time.time() only has the resolution of the interrupt timer (1-15.6 ms)
+			# Note that clock() does not provide time of day information. 
+			# EXPECT DRIFT if you do not have ntp better than the MS version
+			return self.win32TimerOffset + clock()
+		else:
+			# on most other platforms, the best timer is time.time()
+			return time.time()
+
+	# background thead functions
+	def startThread(self):
+		"""Receive data packages, the server clock offset and drift are estimated continuously (see getClock)."""
+		logging.info("starting client thread")
+		try:
+			while True:
+				try:
+					# main data retrieval loop
+					while not self.stoppingStream:
+						retval = self.receive()
+						ta = self.reader.tReceived if self.kernelTimestamps else None
+						self.handlePackage(retval, self.pContent, self.reader.peek() == 3, ta)
+					break
+				except (socket.error, IOError) as e:
+					# socket.timeout too: no data for 3 s
+					self.connected = False
+					self.failCommands(e)
+					if self.stoppingStream:
+						break # stopped while waiting for data
+					if not self.reconnect:
+						raise
+					if not self.reconnectSocket():
+						break # stopped while reconnecting
+			if self.connected:
+				try:
+					self.sendCommand("Bye")
+				except (socket.error, IOError):
+					self.connected = False
+		finally:
+			self.failCommands("stream stopped")
+			logging.info("stopped")
+			self.stoppingStream = False;
+		
+	def startFrames(self):
+		"""Set the byte order and start the stream. The commands are pending before any command
+		sent later, so their responses are matched in order by the stream. Return their futures."""
+		return self.command("SetByteOrder BigEndian", "StreamFrames FrequencyDivisor:{}".format(self.divisor))
+
+	def reconnectSocket(self):
+		"""Connect again with bounded exponential backoff, return False if the stream was 
+		stopped first. History, predictor and clock drift are kept, the clock offset is 
+		estimated again from the first packages, see resync."""
+		logging.warning("connection to {}:{} lost, reconnecting".format(self.host, self.port))
+		delay = self.minBackoff
+		while not self.stoppingStream:
+			try:
+				with self.commandLock: # commands sent meanwhile go after the startup commands
+					self.sock.close()
+					self.openSocket(self.host, self.port) # failures are not logged, once per outage is enough
+					self.startFrames()
+			except (socket.error, IOError) as e:
+				logging.debug("reconnecting to {}:{}: {}".format(self.host, self.port, e))
+				time.sleep(delay)
+				delay = min(2*delay, self.maxBackoff)
+				continue
+			self.clockBefore = self.clock.estimate
+			self.clock.restart()
+			logging.info("reconnected to {}:{}".format(self.host, self.port))
+			return True
+		return False
+
+	def resync(self, tServer):
+		"""After a reconnect, shift the predictor to the new server clock if the server clock
+		jumped (for instance because the server restarted), so it stays warm."""
+		old = self.clockBefore
+		self.clockBefore = None
+		if old is None or not self.useServerTime:
+			return
+		(tRef, offset, drift, std, delay) = old
+		jump = self.clock.toClient(tServer) - (tServer + offset + drift*(tServer - tRef)) # client time
+		if abs(jump) > self.resyncThreshold:
+			logging.info("server clock jumped {:.3f} s, shifting predictor".format(-jump))
+			self.predictor.shift(-jump)
+
+	def handlePackage(self, pType, pContent, superseded=False, ta=None):
+		"""Process a received package, called by the stream thread or by an rtc3dasync.StreamLoop.
+		superseded means that the next data package was already received. ta is the arrival
+		time, now if it is not given."""
+		self.pType = pType
+		self.pContent = pContent
+		tDecode = self.time()
+		if ta is None:
+			ta = tDecode
+		if pType in [0, 1]: # error or command response
+			self.handleResponse(pType, pContent, ta)
+			return
+		if pType != 3: # XML, Nodata or C3D
+			logging.info("received {} package".format(self.pTypes[pType] if pType < len(self.pTypes) else pType))
+			return
+		if self.adaptiveDivisor:
+			self.adaptDivisor(ta)
+		if superseded and self.latestOnly:
+			# nobody can read this frame before the next one is decoded
+			self.nSkipped += 1
+			(components, frame, tServer) = decodePackage(pContent, (2, 5)) # analog and events are kept
+			recorder = self.recorder # stopRecording may set it to None from another thread
+			if recorder is not None:
+				recorder.record(pType, pContent, frame, tServer, ta)
+			self.handleChannels(components, frame, tServer, ta)
+			return
+		(components, self.frame, tServer) = decodePackage(pContent) # all components in one pass
+		recorder = self.recorder # stopRecording may set it to None from another thread
+		if recorder is not None:
+			recorder.record(pType, pContent, self.frame, tServer, ta)
+		self.clock.update(tServer, ta)
+		if self.clockBefore is not None:
+			self.resync(tServer)
+		self.handleChannels(components, self.frame, tServer, ta)
+		if 1 not in components and 4 not in components: # no 3D or 6D
+			return
+		pp = self.stack(components.get(1), components.get(4))
+		if self.latency is not None:
+			self.latency.add(tServer, ta, tDecode, self.clock.toClient(tServer) if self.clock.ready() else None)
+		self.history.append(pp, self.clock.toClient(tServer), ta)
+		if self.useServerTime:
+			self.predictor.update(pp, tServer)
+		else:
+			self.predictor.update(pp, ta)
+		if not self.readyEvent.is_set() and self.predictor.ready() and self.clock.ready():
+			self.readyEvent.set()
+		if self.publisher is not None:
+			with self.publishLock:
+				publisher = self.publisher # None if stopPublishing came first
+				if publisher is not None:
+					publisher.publish(pp, self.clock.toClient(tServer), ta, self.predictor, self.clock, self.useServerTime)
+		
+	def defineBody(self, name, markers):
+		"Name a set of marker indices, for instance the markers of a rigid body, for subscribe."
+		self.bodies[name] = list(markers)
+
+	def subscribe(self, *markers):
+		"""Only decode these 3D markers (indices or body names, see defineBody) into the history 
+		and the predictor, getPosition then returns them in this order. The others cost nothing 
+		but are still in a recording. Without arguments all markers are decoded. 6D tools are 
+		not affected."""
+		indices = []
+		for marker in markers:
+			if isinstance(marker, str):
+				indices.extend(self.bodies[marker])
+			else:
+				indices.append(marker)
+		self.subscriptionEnd = max(indices) + 1 if indices else 0
+		self.subscription = np.array(indices, dtype=int) if indices else None
+
+	def handleChannels(self, components, frame, tServer, ta):
+		"Append analog channels to the analog buffer and queue events for the callbacks."
+		if 2 not in components and 5 not in components:
+			return
+		t = self.clock.toClient(tServer) if self.clock.ready() else ta
+		if 2 in components:
+			self.analog.append(components[2], t, ta)
+		if 5 in components and self.eventCallbacks:
+			self.events.put((frame, t, components[5].copy())) # the package is only valid until the next receive
+
+	def addEventCallback(self, callback):
+		"""Call callback(frame, t, events) for every data package with event components, t is the 
+		server time on the client clock and events an array with a row of 32 bit words per event.
+		Callbacks run in a separate thread, so they do not delay the stream."""
+		self.eventCallbacks.append(callback)
+		if self.eventThread is None:
+			self.eventThread = threading.Thread(target=self.dispatchEvents, name="events")
+			self.eventThread.daemon = True
+			self.eventThread.start()
+
+	def removeEventCallback(self, callback):
+		self.eventCallbacks.remove(callback)
+
+	def dispatchEvents(self):
+		while True:
+			event = self.events.get()
+			for callback in list(self.eventCallbacks):
+				try:
+					callback(*event)
+				except Exception as e:
+					logging.error("ERROR in event callback {}: {}".format(callback, e))
+
+	def getAnalog(self, k=1):
+		"""Return copies (v, t) of the last k analog samples, v is k x nChannel (V), t the server
+		times on the client clock (s). Both are empty (0 x 0 and 0) if no analog data arrived,
+		for instance from a server that only streams 3D markers."""
+		while True:
+			seq = self.analog.begin()
+			n = min(k, len(self.analog))
+			(v, t, ta) = self.analog.last(n)
+			(v, t) = (v.copy(), t.copy())
+			if not self.analog.retry(seq, n):
+				return (v, t)
+
+	def stack(self, markers, tools):
+		"""Return the rows that go into the history and the predictor: the 3D markers (m), followed 
+		by four rows per 6D tool: its position (m) and the three rows of its rotation matrix.
+		Orientation is then buffered and extrapolated by the same vectorized code as position."""
+		subscription = self.subscription
+		if markers is not None and subscription is not None:
+			if self.subscriptionEnd <= len(markers):
+				markers = markers[subscription] # only these are converted
+			else:
+				# missing markers are nan, so the rows stay the same
+				valid = subscription < len(markers)
+				subscribed = np.full((len(subscription), 4), np.nan)
+				subscribed[valid] = markers[subscription[valid]]
+				markers = subscribed
+		nMarker = 0 if markers is None else len(markers)
+		nTool = 0 if tools is None else len(tools)
+		pp = np.empty((nMarker + 4*nTool, 3))
+		if nMarker:
+			np.multiply(markers[:,:3], 1e-3, out=pp[:nMarker])
+		if nTool:
+			poses = pp[nMarker:].reshape(nTool, 4, 3)
+			np.multiply(tools[:,4:7], 1e-3, out=poses[:,0])
+			quaternionsToMatrices(tools[:,:4], out=poses[:,1:])
+		(self.nMarker, self.nTool) = (nMarker, nTool)
+		return pp
+
+	def handleResponse(self, pType, pContent, ta):
+		"Resolve the oldest pending command with a response (error or command package) that arrived at ta."
+		response = pContent.decode('utf-8', 'replace').rstrip('\0')
+		try:
+			future = self.pending.popleft()
+		except IndexError:
+			logging.info("received {} without pending command: {}".format(self.pTypes[pType], response))
+			return
+		future.rtt = ta - future.tSent
+		logging.info("response to {} after {:.2f} ms: {}".format(future.body, 1e3*future.rtt, response))
+		if pType == 0:
+			future.set_exception(IOError("{} failed: {}".format(future.body, response)))
+		else:
+			future.set_result(response)
+
+	def adaptDivisor(self, ta):
+		"""Every adaptInterval s, set the FrequencyDivisor of the stream to the largest that 
+		still gives queryOversampling samples per query (nQuery) and at least one sample 
+		per predictor.maxInterval. The server skips the other frames, saving network and CPU."""
+		self.nAdaptPackage += 1
+		if ta < self.tAdapt + self.adaptInterval:
+			return
+		if self.tAdapt:
+			elapsed = ta - self.tAdapt
+			frameRate = self.nAdaptPackage*self.divisor/elapsed # of the server, before decimation
+			queryRate = (self.nQuery - self.nAdaptQuery)/elapsed
+			needed = max(1.0/self.predictor.maxInterval, self.queryOversampling*queryRate)
+			divisor = int(max(1, min(self.maxDivisor, frameRate // needed)))
+			if divisor < self.divisor or divisor > 1.2*self.divisor: # decimate more only if it is worth it
+				logging.info("{:.0f} frames/s, {:.0f} queries/s: FrequencyDivisor {}".format(frameRate, queryRate, divisor))
+				self.divisor = divisor
+				self.command("StreamFrames FrequencyDivisor:{}".format(divisor))
+		self.tAdapt = ta
+		self.nAdaptPackage = 0
+		self.nAdaptQuery = self.nQuery
+
+	def measureLatency(self):
+		"Start (again) to collect histograms of network delay, queueing delay and jitter and return them, see latency.LatencyStats."
+		self.latency = latency.LatencyStats()
+		return self.latency
+		
+	def startPublishing(self, name="rudolph", capacity=64):
+		"""Publish frames and predictor state in shared memory block name, for sharedpose.PoseReader 
+		in other processes. Python 3 only."""
+		import sharedpose
+		self.stopPublishing()
+		self.publisher = sharedpose.PosePublisher(name, capacity)
+		
+	def stopPublishing(self):
+		"Remove the shared memory block, waits for a publish in progress."
+		with self.publishLock:
+			(p, self.publisher) = (self.publisher, None)
+			if p is not None:
+				p.close()
+		
+	def startRecording(self, fileName="", **kwargs):
+		"Record all data packages to fileName.dat and fileName.idx, see recorder.Recorder."
+		self.recorder = recorder.Recorder(fileName, **kwargs)
+		
+	def stopRecording(self):
+		if self.recorder is not None:
+			r = self.recorder
+			self.recorder = None
+			r.close()
+		
+	def startStream(self):
+		"""Start the stream and the background thread that synchronizes with the server. 
+		Commands can be sent right away, they go after the startup commands."""
+		self.startFrames()
+		self.thread = threading.Thread(target = self.startThread)
+		self.thread.start()
+		
+	def stopStream(self):
+		"Stop the background thread that synchronizes with the server"
+		if self.thread is not None and self.thread.is_alive():
+			self.stoppingStream = True
+			
+	# query functions
+	def ready(self):
+		"Return True if getPosition can extrapolate."
+		return self.readyEvent.is_set()
+
+	def waitReady(self, timeout=None):
+		"""Wait until the predictor has enough samples and the clock an offset, at most timeout s.
+		Return True if the client is ready."""
+		return self.readyEvent.wait(timeout)
+
+	def predictorTime(self, t):
+		"""Return (predictor time, held) of client time t (s, float or array). While the 
+		connection is down, or when t is more than maxExtrapolation s after the last sample, 
+		the quadratic would run away, so times after the last sample are held at it and held is
+		True. Holding is logged once, until the samples are fresh again."""
+		if self.useServerTime:
+			t = self.clock.toServer(t)
+		tLast = self.predictor.t
+		age = np.max(t) - tLast
+		if self.connected and age <= self.maxExtrapolation:
+			self.holding = False
+			return (t, False)
+		if not self.holding:
+			self.holding = True
+			logging.warning("{} {}, holding the last sample".format(type(self).__name__,
+				"lost the connection" if not self.connected else "has no sample for {:.3f} s".format(age)))
+		return (np.minimum(t, tLast), bool(age > 0))
+
+	def getPosition(self, t = None, dt = None, out = None):
+		"""Extrapolate from the last positions at arrival times to the values at time t.
+		If out (nMarker x 3 array) is given, the result is written into it."""
+		return self.getPosition2(t, dt, out)[0]
+		
+	def getPosition2(self, t=None, dt=None, out=None):
+		"""Like getPosition, but return the extrapolation time as second argument. It is 0 while
+		the last sample is held, see predictorTime."""
+		self.nQuery += 1
+		if not self.predictor.ready():
+			logging.error("{} was not yet initialized when getPosition request was received".format(type(self).__name__))
+			return [np.matrix([0,0,0]), 0]
+		if t==None and dt==None:
+			# simply return last value
+			while True:
+				seq = self.history.begin()
+				p = np.matrix(self.history.last(1)[0][0]) # copy
+				if not self.history.retry(seq, 1):
+					return [p, 0]
+			
+		if t==None:
+			# relative time
+			t = self.time() + dt
+			
+		# the predictor runs on server time, so only the query time is converted.
+		# A new clock estimate does not disturb the predictor state.
+		t = self.predictorTime(t)[0]
+		if out is None:
+			p = np.asmatrix(self.predictor.predict(t))
+		else:
+			p = self.predictor.predict(t, out)
+		#print ("extrapolation time: {:.3f}".format(t - self.predictor.t))
+		return [p, t - self.predictor.t]
+
+	def getTools(self, t=None, dt=None):
+		"""Return (positions, rotations) of the 6D tools at time t (or now + dt, or the last frame
+		if neither is given): an nTool x 3 array (m) and an nTool x 3 x 3 array of rotation matrices.
+		Extrapolated matrices are made orthonormal again."""
+		nMarker = self.nMarker
+		nTool = self.nTool
+		if not self.predictor.ready() or not nTool:
+			return (np.zeros((0, 3)), np.zeros((0, 3, 3)))
+		p = np.asarray(self.getPosition(t, dt))
+		poses = p[nMarker:nMarker+4*nTool].reshape(nTool, 4, 3)
+		if t is None and dt is None:
+			return (poses[:,0], poses[:,1:])
+		(u, s, vt) = np.linalg.svd(poses[:,1:])
+		return (poses[:,0], np.matmul(u, vt))
+		
+	def getPositions(self, times, out=None):
+		"""Extrapolate to an array of times in one vectorized evaluation, for instance per eye or
+		at the start and end of a frame. Return an nTimes x nMarker x 3 array, written into out if given."""
+		self.nQuery += 1
+		if not self.predictor.ready():
+			logging.error("{} was not yet initialized when getPositions request was received".format(type(self).__name__))
+			return np.zeros((np.size(times), 1, 3))
+		times = self.predictorTime(np.asarray(times, dtype=float))[0]
+		return self.predictor.predictTimes(times, out)
+		
+	def getXVA(self, t=None, dt=None, out=None):
+		"""Return (position, velocity, acceleration) of all markers at time t (or now + dt) from the
+		predictor state, as nMarker x 3 arrays in m, m/s and m/s**2, like 
+		SledClientSimulator.getXVA. If out (3 x nMarker x 3 array) is given, they are views on it.
+		While the last sample is held (see predictorTime) velocity and acceleration are 0."""
+		self.nQuery += 1 # also for getXV and the scalar getXVA of SledClient, which call this
+		if not self.predictor.ready():
+			logging.error("{} was not yet initialized when getXVA request was received".format(type(self).__name__))
+			return (np.zeros((1, 3)),)*3
+		if t is None:
+			t = self.time() + (dt or 0)
+		(t, held) = self.predictorTime(t)
+		xva = self.predictor.predictXVA(t, out)
+		if held:
+			xva[1][...] = 0
+			xva[2][...] = 0
+		elif self.useServerTime:
+			drift = self.clock.estimate[2] # to derivatives in client time
+			xva[1] /= 1 + drift
+			xva[2] /= (1 + drift)**2
+		return (xva[0], xva[1], xva[2])
+		
+	def getXV(self, t=None, dt=None):
+		"Return (position, velocity), see getXVA."
+		return self.getXVA(t, dt)[:2]
+
+	def getClock(self):
+		"""Return (offset, drift, residual std, median excess delay) of the server clock,
+		see clocksync.ClockEstimator.getEstimate."""
+		return self.clock.getEstimate()
+
+	def getBuffer(self):
+		"Return copies of the last nBuffer positions and times, empty arrays before the first frame."
+		while True:
+			seq = self.history.begin()
+			k = min(self.nBuffer, len(self.history))
+			(p, t, ta) = self.history.last(k)
+			(p, t) = (p.copy(), t.copy())
+			if not self.history.retry(seq, k):
+				return (p, t)
+
+	def getBufferViews(self):
+		"""Like getBuffer, but return (seq, p, t) with views on the history instead of copies.
+		The stream thread may overwrite them, so use them and then call
+		history.retry(seq, len(t)). If it returns True, they changed and you must read again:
+
+			while True:
+				(seq, p, t) = client.getBufferViews()
+				result = f(p, t)
+				if not client.history.retry(seq, len(t)):
+					break
+		"""
+		seq = self.history.begin()
+		(p, t, ta) = self.history.last(min(self.nBuffer, len(self.history)))
+		return (seq, p, t)
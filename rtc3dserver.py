@@ -0,0 +1,285 @@
+#!/usr/bin/python
+"""Local stand-ins for the First Principles and sled servers, for testing and benchmarking
+the clients without lab hardware. They speak the framing FpClient.receive expects and
+handle SetByteOrder, StreamFrames and Bye.
+
+	python rtc3dserver.py replay log/2016-06-03T15.47.12 --speed 2
+	python rtc3dserver.py synthetic --rate 2000 --markers 100 --jitter 0.001
+	python rtc3dserver.py --port 3375 synthetic --markers 1
+"""
+from __future__ import print_function
+import socket, struct, threading, time, logging, argparse, re, math, numpy as np
+import rtc3dclient, recorder, sledclientsimulator
+
+class Rtc3dServer(object):
+	"""Server base class: answers commands and streams the data packages of packages().
+	Every connection gets a thread for its commands and one for its stream."""
+	def __init__(self, port=3020, host="localhost", speed=1.0):
+		self.host = host
+		self.port = port
+		self.speed = speed # 1: real time, N: N times faster, 0: as fast as possible
+		self.running = False
+		self.sock = None
+		self.thread = None
+
+	def start(self):
+		"Start listening in a background thread."
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.sock.bind((self.host, self.port))
+		self.sock.listen(5)
+		self.sock.settimeout(0.2) # to notice stop()
+		self.running = True
+		self.thread = threading.Thread(target=self.acceptThread)
+		self.thread.daemon = True
+		self.thread.start()
+		logging.info("{} listening on {}:{}".format(type(self).__name__, self.host, self.port))
+
+	def stop(self):
+		self.running = False
+		if self.thread is not None:
+			self.thread.join()
+		self.sock.close()
+
+	def acceptThread(self):
+		while self.running:
+			try:
+				(conn, address) = self.sock.accept()
+			except socket.timeout:
+				continue
+			conn.settimeout(None)
+			conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			thread = threading.Thread(target=self.connectionThread, args=(conn, address))
+			thread.daemon = True
+			thread.start()
+
+	def connectionThread(self, conn, address):
+		logging.info("connection from {}".format(address))
+		connection = Connection(conn)
+		reader = rtc3dclient.FrameReader(conn)
+		try:
+			while self.running:
+				(pType, pContent) = reader.read()
+				command = bytes(pContent).decode('utf-8', 'replace')
+				if pType != 1:
+					connection.send(b"expected a command", 0)
+				elif command.startswith("Bye"):
+					break
+				elif command.startswith("StreamFrames"):
+					connection.send(b"OK", 1)
+					m = re.search(r"FrequencyDivisor:(\d+)", command)
+					connection.divisor = int(m.group(1)) if m else 1
+					if connection.thread is None:
+						connection.thread = threading.Thread(target=self.streamThread, args=(connection,))
+						connection.thread.daemon = True
+						connection.thread.start()
+				else:
+					connection.send(self.command(command), 1)
+		except (socket.error, IOError) as e:
+			logging.info("connection from {} lost: {}".format(address, e))
+		connection.streaming = False
+		if connection.thread is not None:
+			connection.thread.join()
+		conn.close()
+		logging.info("connection from {} closed".format(address))
+
+	def streamThread(self, connection):
+		t0 = time.time()
+		n = 0
+		try:
+			for (t, pContent) in self.packages():
+				if not connection.streaming or not self.running:
+					break
+				n += 1
+				if n % connection.divisor:
+					continue
+				if self.speed:
+					delay = t0 + t/self.speed - time.time()
+					if delay > 0:
+						time.sleep(delay)
+				connection.send(pContent, 3)
+		except (socket.error, IOError) as e:
+			logging.info("stream stopped: {}".format(e))
+
+	# override these
+	def command(self, command):
+		"Return the response to a command other than StreamFrames and Bye."
+		return b"OK"
+
+	def packages(self):
+		"Generate (t, pContent) of data packages, t in s from the start of the stream."
+		return iter([])
+
+class Connection(object):
+	"Socket of one client, the command and stream threads both send on it."
+	header = struct.Struct(">II")
+	def __init__(self, sock):
+		self.sock = sock
+		self.lock = threading.Lock()
+		self.streaming = True
+		self.divisor = 1
+		self.thread = None
+
+	def send(self, body, pType):
+		if isinstance(body, memoryview):
+			body = body.tobytes()
+		with self.lock:
+			self.sock.sendall(self.header.pack(len(body)+8, pType) + body)
+
+def shiftTime(pContent, dt, scale=1.0, tRef=0.0):
+	"""Return a copy of data package pContent with the component times t (s) mapped to
+	tRef + (t - tRef + dt)*scale, by default with dt added."""
+	pContent = bytearray(pContent)
+	cCount = struct.unpack_from(">I", pContent, 0)[0]
+	pointer = 4
+	for i in range(cCount):
+		(cSize, cType, cFrame, cTime) = struct.unpack_from(">IIIQ", pContent, pointer)
+		if scale == 1.0:
+			cTime += int(round(dt*1e6)) # exact
+		else:
+			cTime = int(round(1e6*tRef + (cTime - 1e6*tRef + 1e6*dt)*scale))
+		struct.pack_into(">Q", pContent, pointer+12, cTime)
+		pointer += cSize
+	return memoryview(pContent)
+
+class ReplayServer(Rtc3dServer):
+	"""Stream a session recorded with recorder.Recorder with the recorded timing (arrival
+	times) divided by speed. The component times are divided by speed as well, so a client
+	sees a consistent server clock at any speed (at speed 0 they are left as recorded).
+	With repeat the session starts again at the end, with server times that continue one
+	frame interval (the median of the recording) after the previous pass ended."""
+	def __init__(self, fileName, port=3020, host="localhost", speed=1.0, repeat=False):
+		super(ReplayServer, self).__init__(port, host, speed)
+		self.recording = recorder.Recording(fileName)
+		self.repeat = repeat
+
+	def packages(self):
+		tStart = 0.0
+		while True:
+			records = self.recording.records
+			if len(records) == 0:
+				return
+			t0 = records['tArrival'][0]
+			tRef = records['tServer'][0]
+			scale = 1.0/self.speed if self.speed else 1.0
+			for i in range(len(records)):
+				(pType, pContent, frame, tServer, tArrival) = self.recording.package(i)
+				if tStart or scale != 1.0:
+					pContent = shiftTime(pContent, tStart, scale, tRef)
+				yield (tStart + tArrival - t0, pContent)
+			if not self.repeat:
+				return
+			interval = float(np.median(np.diff(records['tServer']))) if len(records) > 1 else 0.0
+			tStart += records['tServer'][-1] - tRef + interval
+
+class SyntheticServer(Rtc3dServer):
+	"""Stream synthetic data packages at rate Hz with nMarker 3D markers, nAnalog analog
+	channels and nTool 6D tools. The markers are on a grid (spacing 5 cm in y and z) that
+	moves in x along move (any sledclientsimulator.Move), by default a sled going back 
+	and forth. The tools move along, 10 cm apart in y, and turn around z by 10 rad/m of x. Packages are sent jitter (s, standard deviation) late and every burstInterval 
+	s, burstLength s of packages are held back and sent at once. Component times are exact.
+	With wallClock, component times are the time.time() of the scheduled send rather
+	than the time since the start of the stream (for latency measurements on one host)."""
+	def __init__(self, port=3020, host="localhost", speed=1.0, rate=400.0, nMarker=1, nAnalog=0, nTool=0, 
+			jitter=0.0, burstInterval=0.0, burstLength=0.05, move=None, wallClock=False):
+		super(SyntheticServer, self).__init__(port, host, speed)
+		self.rate = rate
+		self.nMarker = nMarker
+		self.nAnalog = nAnalog
+		self.nTool = nTool
+		self.jitter = jitter
+		self.burstInterval = burstInterval
+		self.burstLength = burstLength
+		self.wallClock = wallClock
+		if move is None:
+			move = sledclientsimulator.SineMove(0, 1.5, -0.1, 0.1) # 20 cm, 3 s period
+		self.move = move
+		# marker grid relative to the moving point (mm)
+		i = np.arange(nMarker)
+		n = int(math.ceil(math.sqrt(nMarker)))
+		self.grid = np.zeros((nMarker, 4))
+		self.grid[:,1] = 50.0*(i % n)
+		self.grid[:,2] = 50.0*(i // n)
+		self.grid[:,3] = 0.1 # delta
+
+	def component(self, cType, frame, t, body):
+		return struct.pack(">IIIQ", 20+len(body), cType, frame, int(round(t*1e6))) + body
+
+	def package(self, frame, t):
+		"Return the data package of frame at server time t (s)."
+		x = 1e3*self.move.getX(t) # mm
+		if self.wallClock:
+			if self.speed:
+				t = self.tStart + t/self.speed # scheduled send time
+			else:
+				t = time.time()
+		components = []
+		if self.nMarker:
+			markers = self.grid.copy()
+			markers[:,0] += x
+			components.append(self.component(1, frame, t, 
+				struct.pack(">I", self.nMarker) + markers.astype('>f4').tobytes()))
+		if self.nAnalog:
+			v = np.sin(2*math.pi*t + np.arange(self.nAnalog)) # V
+			components.append(self.component(2, frame, t,
+				struct.pack(">I", self.nAnalog) + v.astype('>f4').tobytes()))
+		if self.nTool:
+			tools = np.zeros((self.nTool, 8))
+			tools[:,0] = math.cos(5*x*1e-3) # q0, half of 10 rad/m
+			tools[:,3] = math.sin(5*x*1e-3) # qz
+			tools[:,4] = x
+			tools[:,5] = 100.0*np.arange(self.nTool)
+			tools[:,7] = 0.1 # error
+			components.append(self.component(4, frame, t,
+				struct.pack(">I", self.nTool) + tools.astype('>f4').tobytes()))
+		return struct.pack(">I", len(components)) + b"".join(components)
+
+	def packages(self):
+		self.tStart = time.time() # the stream thread starts its clock at the same time
+		frame = 0
+		tBurst = self.burstInterval
+		while True:
+			t = frame/self.rate
+			tSend = t
+			if self.jitter:
+				tSend += abs(np.random.normal(0, self.jitter))
+			if self.burstInterval and tBurst <= t:
+				if t < tBurst + self.burstLength:
+					tSend = max(tSend, tBurst + self.burstLength) # held back
+				else:
+					tBurst += self.burstInterval
+			yield (tSend, self.package(frame, t))
+			frame += 1
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO)
+	parser = argparse.ArgumentParser(description="stand-in First Principles / sled server")
+	subparsers = parser.add_subparsers(dest="mode")
+	parser.add_argument("--host", default="localhost")
+	parser.add_argument("--port", type=int, default=3020)
+	parser.add_argument("--speed", type=float, default=1.0, help="1: real time, N: N times faster, 0: as fast as possible")
+	replay = subparsers.add_parser("replay", help="replay a recorded session")
+	replay.add_argument("fileName", help="session, without .dat or .idx")
+	replay.add_argument("--repeat", action="store_true")
+	synthetic = subparsers.add_parser("synthetic", help="stream synthetic markers")
+	synthetic.add_argument("--rate", type=float, default=400.0, help="frames per second")
+	synthetic.add_argument("--markers", type=int, default=1, help="number of 3D markers")
+	synthetic.add_argument("--analog", type=int, default=0, help="number of analog channels")
+	synthetic.add_argument("--tools", type=int, default=0, help="number of 6D tools")
+	synthetic.add_argument("--jitter", type=float, default=0.0, help="send delay standard deviation (s)")
+	synthetic.add_argument("--burst", type=float, default=0.0, help="interval between bursts (s), 0: no bursts")
+	synthetic.add_argument("--burstLength", type=float, default=0.05, help="duration held back per burst (s)")
+	args = parser.parse_args()
+	if args.mode == "replay":
+		server = ReplayServer(args.fileName, args.port, args.host, args.speed, args.repeat)
+	elif args.mode == "synthetic":
+		server = SyntheticServer(args.port, args.host, args.speed, args.rate, args.markers, args.analog, 
+			args.tools, args.jitter, args.burst, args.burstLength)
+	else:
+		parser.error("choose a mode")
+	server.start()
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		server.stop()
@@ -0,0 +1,275 @@
+"""Publish the poses of a tracker client in shared memory for readers in other processes
+(renderer, data logger, monitoring tools), without extra server connections. Python 3 only.
+
+	positionClient.startPublishing("rudolph")      # in the process that owns the connection
+	...
+	reader = sharedpose.PoseReader("rudolph")      # in any process on the same host
+	p = reader.getPosition(dt=5./60)
+
+The block holds a header, the predictor as a quadratic in time (see
+predictor.Predictor.getCoefficients) and a ring of the last capacity frames. The header
+has a sequence counter that is odd while the publisher writes (a seqlock, like
+ringbuffer.RingBuffer), so readers take no lock and never block the stream thread.
+Times in the block are time.time(), readers and publisher must use the same clock.
+"""
+import sys, time, logging, numpy as np
+import predictor
+from multiprocessing import shared_memory, resource_tracker
+
+headerType = np.dtype([
+	('magic', 'S8'),
+	('sequence', '<u8'),   # even when idle, odd while writing
+	('n', '<u8'),          # number of published frames
+	('nMarker', '<u4'),
+	('capacity', '<u4'),   # of the frame ring
+	('closed', '<u4'),     # the publisher made a new block or stopped
+	('ready', '<u4'),      # the coefficients can be used
+	('tPredictor', '<f8'), # server time of the last predictor sample (s)
+	('clock', '<f8', (3,)),# clock estimate: server reference time, offset, drift
+	('useServerTime', '<u4'),
+	('pad', '<u4'),
+	])
+magic = b"RTC3DPOS"
+
+def blockSize(nMarker, capacity):
+	return headerType.itemsize + 8*(3*nMarker*3 + capacity*(nMarker*3 + 2))
+
+def layout(buf, nMarker, capacity):
+	"Return (header, coefficients, p, t, ta) views on a shared memory block."
+	header = np.ndarray((), dtype=headerType, buffer=buf)
+	offset = headerType.itemsize
+	arrays = []
+	for shape in [(3, nMarker, 3), (capacity, nMarker, 3), (capacity,), (capacity,)]:
+		a = np.ndarray(shape, dtype='<f8', buffer=buf, offset=offset)
+		offset += a.nbytes
+		arrays.append(a)
+	return [header] + arrays
+
+def openUntracked(name):
+	"""Attach to an existing block without registering it with the resource tracker, which
+	would remove it when this process exits (or unregister it for the publisher if the
+	tracker is shared with a child process). The publisher owns the block."""
+	if sys.version_info >= (3, 13):
+		return shared_memory.SharedMemory(name=name, track=False)
+	register = resource_tracker.register
+	resource_tracker.register = lambda name, rtype: None
+	try:
+		return shared_memory.SharedMemory(name=name)
+	finally:
+		resource_tracker.register = register
+
+class PosePublisher(object):
+	"""Writes frames and predictor state of one client into shared memory block name.
+	The block is made at the first frame and made again if the number of markers changes."""
+	def __init__(self, name="rudolph", capacity=64):
+		self.name = name
+		self.capacity = capacity
+		self.shm = None
+		self.nMarker = 0
+
+	def allocate(self, nMarker):
+		self.close()
+		size = blockSize(nMarker, self.capacity)
+		try:
+			self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+		except FileExistsError:
+			# left behind by a publisher that did not close
+			logging.warning("replacing shared memory block {}".format(self.name))
+			old = shared_memory.SharedMemory(name=self.name)
+			old.unlink()
+			old.close()
+			self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+		self.nMarker = nMarker
+		(self.header, self.coefficients, self.p, self.t, self.ta) = layout(self.shm.buf, nMarker, self.capacity)
+		self.header['nMarker'] = nMarker
+		self.header['capacity'] = self.capacity
+		self.header['magic'] = magic # last, readers wait for it
+
+	def publish(self, p, t, ta, predictor, clock, useServerTime=True):
+		"""Add frame p (nMarker x 3, m) with server time t on the client clock and arrival time ta,
+		with the state of predictor and clock (clocksync.ClockEstimator) after it."""
+		if len(p) != self.nMarker:
+			self.allocate(len(p))
+		header = self.header
+		n = int(header['n'])
+		i = n % self.capacity
+		header['sequence'] += 1 # odd: writing
+		self.p[i] = p
+		self.t[i] = t
+		self.ta[i] = ta
+		if predictor.ready() and clock.ready():
+			(header['tPredictor'], c) = predictor.getCoefficients(self.coefficients)
+			header['clock'] = clock.estimate[:3]
+			header['useServerTime'] = useServerTime
+			header['ready'] = 1
+		header['n'] = n + 1
+		header['sequence'] += 1 # even: done
+
+	def close(self):
+		"Tell the readers and remove the block."
+		if self.shm is None:
+			return
+		self.header['closed'] = 1
+		del self.header, self.coefficients, self.p, self.t, self.ta # release the views on the block
+		self.shm.close()
+		self.shm.unlink()
+		self.shm = None
+
+class PoseReader(object):
+	"""Reads the block of a PosePublisher, with the query functions of rtc3dclient.Rtc3dClient.
+	Reattaches when the publisher makes a new block."""
+	maxExtrapolation = 0.25 # s, like Rtc3dClient.maxExtrapolation
+	
+	def __init__(self, name="rudolph", timeout=3.0):
+		self.name = name
+		self.shm = None
+		self.holding = False
+		self.attach(timeout)
+
+	def attach(self, timeout=3.0):
+		"Attach to the block, wait up to timeout s for it to appear."
+		self.close()
+		tEnd = time.time() + timeout
+		while True:
+			try:
+				shm = openUntracked(self.name)
+				break
+			except FileNotFoundError:
+				if time.time() > tEnd:
+					raise
+				time.sleep(0.01)
+		header = np.ndarray((), dtype=headerType, buffer=shm.buf)
+		while header['magic'] != magic:
+			time.sleep(0.001)
+		(nMarker, capacity) = (int(header['nMarker']), int(header['capacity']))
+		del header
+		self.shm = shm
+		(self.header, self.coefficients, self.p, self.t, self.ta) = layout(shm.buf, nMarker, capacity)
+		self.capacity = capacity
+		self.c = np.empty((3, nMarker, 3)) # copy of the coefficients
+		self.shape = (nMarker, 3)
+
+	def close(self):
+		if self.shm is not None:
+			del self.header, self.coefficients, self.p, self.t, self.ta
+			self.shm.close()
+			self.shm = None
+
+	def begin(self):
+		"Return the sequence number for retry(), waits for a write in progress."
+		if self.header['closed']:
+			self.attach()
+		while True:
+			seq = int(self.header['sequence'])
+			if not seq & 1:
+				return seq
+			time.sleep(0)
+
+	def retry(self, seq, k=0):
+		"""Return True if a reader must read again: with k, the publisher came round to the last
+		k frames since begin(), without k anything was published."""
+		if k:
+			return int(self.header['sequence']) - seq > 2*(self.capacity - k)
+		return int(self.header['sequence']) != seq
+
+	def time(self):
+		return time.time()
+
+	def ready(self):
+		return bool(self.header['ready'])
+
+	def waitReady(self, timeout=None):
+		"Like Rtc3dClient.waitReady, polls the block."
+		tEnd = None if timeout is None else time.time() + timeout
+		while not self.ready():
+			if tEnd is not None and time.time() > tEnd:
+				return False
+			time.sleep(0.001)
+		return True
+
+	def last(self, k=1):
+		"Return copies (p, t, ta) of the last k frames, oldest first."
+		while True:
+			seq = self.begin()
+			n = int(self.header['n'])
+			k = min(k, n, self.capacity)
+			i = (n - k + np.arange(k)) % self.capacity
+			(p, t, ta) = (self.p[i], self.t[i], self.ta[i]) # fancy indexing copies
+			if not self.retry(seq, k):
+				return (p, t, ta)
+
+	def getCoefficients(self):
+		"Return (t, c, clock, useServerTime), see predictor.Predictor.getCoefficients."
+		while True:
+			seq = self.begin()
+			self.c[...] = self.coefficients
+			header = self.header[()] # copy
+			if not self.retry(seq):
+				return (float(header['tPredictor']), self.c, header['clock'], bool(header['useServerTime']))
+
+	def hold(self, dt):
+		"""Return (dt, held) for dt (s after the last sample, float or array), with the times 
+		after the last sample set to 0 when dt is more than maxExtrapolation, like 
+		Rtc3dClient.predictorTime. The block does not tell whether the publisher is connected, 
+		only the age of the last sample counts."""
+		age = np.max(dt)
+		if age <= self.maxExtrapolation:
+			self.holding = False
+			return (dt, False)
+		if not self.holding:
+			self.holding = True
+			logging.warning("PoseReader {} has no sample for {:.3f} s, holding the last sample".format(self.name, age))
+		return (np.minimum(dt, 0), True)
+
+	def getPositions(self, times, out=None):
+		"Like Rtc3dClient.getPositions."
+		if not self.ready():
+			logging.error("PoseReader {} was not yet initialized when getPositions request was received".format(self.name))
+			return np.zeros((np.size(times), 1, 3))
+		times = np.asarray(times, dtype=float)
+		(tPredictor, c, (tRef, offset, drift), useServerTime) = self.getCoefficients()
+		if useServerTime:
+			times = (times - offset + drift*tRef) / (1 + drift)
+		return predictor.polynomialAt(c, self.hold(times - tPredictor)[0], out)
+
+	def getXVA(self, t=None, dt=None):
+		"Like Rtc3dClient.getXVA."
+		if not self.ready():
+			logging.error("PoseReader {} was not yet initialized when getXVA request was received".format(self.name))
+			return (np.zeros((1, 3)),)*3
+		if t is None:
+			t = self.time() + (dt or 0)
+		(tPredictor, c, (tRef, offset, drift), useServerTime) = self.getCoefficients()
+		if useServerTime:
+			t = (t - offset + drift*tRef) / (1 + drift)
+		else:
+			drift = 0.0
+		(dt, held) = self.hold(t - tPredictor)
+		xva = predictor.polynomialXVA(c.copy(), dt)
+		if held:
+			return (xva[0], np.zeros_like(xva[1]), np.zeros_like(xva[2]))
+		return (xva[0], xva[1]/(1 + drift), xva[2]/(1 + drift)**2)
+
+	def getPosition(self, t=None, dt=None, out=None):
+		"Like Rtc3dClient.getPosition."
+		return self.getPosition2(t, dt, out)[0]
+
+	def getPosition2(self, t=None, dt=None, out=None):
+		"Like Rtc3dClient.getPosition2."
+		if not self.ready():
+			logging.error("PoseReader {} was not yet initialized when getPosition request was received".format(self.name))
+			return [np.matrix([0,0,0]), 0]
+		if t is None and dt is None:
+			return [np.asmatrix(self.last(1)[0][0]), 0]
+		if t is None:
+			t = self.time() + dt
+		(tPredictor, c, (tRef, offset, drift), useServerTime) = self.getCoefficients()
+		if useServerTime:
+			t = (t - offset + drift*tRef) / (1 + drift) # see clocksync.ClockEstimator.toServer
+		dt = self.hold(t - tPredictor)[0]
+		p = np.empty(self.shape) if out is None else np.asarray(out)
+		np.multiply(c[2], dt, out=p)
+		p += c[1]
+		p *= dt
+		p += c[0]
+		return [np.asmatrix(p) if out is None else out, dt]
@@ -25,6 +25,10 @@ todo: moves with v0 != 0 (like in SledSimulator)
 '''
 
 import math, sys, time, numpy as np
+try:
+	from concurrent.futures import Future
+except ImportError: # Python 2 without the futures backport
+	from rtc3dclient import Future
 
 class Move(object):
 	"Linear move, use this as base class"
@@ -111,13 +115,12 @@ class ContinuousMove(Move):
 		tNorm = (t - self.t0)/(self.tHalfperiod-self.t0)%2
 		vFactor = 1.0
 		if tNorm>1:
-			tNorm = 2.0 - tNorm
+			tNorm = 2.0 - tNorm # going back, mirrored in time: v changes sign, a does not
 			vFactor = -1.0
-			aFactor = -1.0
 		xNorm, vNorm, aNorm = self.sigmoid(tNorm)
 		return (self.x0 + (self.x1-self.x0)*xNorm, 
 			vFactor*(self.x1-self.x0)/(self.tHalfperiod-self.t0)*vNorm,
-			aFactor*(self.x1-self.x0)/(self.tHalfperiod-self.t0)**2*aNorm)
+			(self.x1-self.x0)/(self.tHalfperiod-self.t0)**2*aNorm)
 
 class SineMove(ContinuousMove):
 	def sigmoid(self, t):
@@ -137,14 +140,20 @@ class SledClientSimulator:
 
 	def time(self):
 		return time.time()
+
+	def ready(self):
+		return True
+
+	def waitReady(self, timeout=None):
+		return True
 		
- 	def getX(self, t=None):
+	def getX(self, t=None):
 		x, v, a = self.getXVA(t)
 		return x
- 	def getXV(self, t=None):
+	def getXV(self, t=None):
 		x, v, a = self.getXVA(t)
 		return (x, v)
- 	def getXVA(self, t=None):
+	def getXVA(self, t=None):
 		"""Pop finished moves and return x and v at times t """
 		if t == None:
 			t = self.time() # real world time
@@ -207,12 +216,12 @@ class SledClientSimulator:
 		
 	def getV(self, t=None):
 		"""return current velocity"""
-		x, v, a = self.getXV(t)
+		x, v = self.getXV(t)
 		return v
 
 	def getA(self, t=None):
 		"""return current acceleration"""
-		x, v = self.getXVA(t)
+		x, v, a = self.getXVA(t)
 		return a
 
 	def testSequence(self, tList, xList):
@@ -233,6 +242,15 @@ class SledClientSimulator:
 	def sendCommand(self, body):
 		pass
 
+	def command(self, *bodies):
+		"same method as in SledClient, the commands are accepted immediately"
+		futures = []
+		for body in bodies:
+			future = Future()
+			future.set_result("OK")
+			futures.append(future)
+		return futures
+
 		
 if __name__ == '__main__':
 	s = SledClientSimulator(t=0)
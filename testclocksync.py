@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Checks of clocksync.ClockEstimator on a synthetic server clock with offset, drift and
+network delays.
+
+	python testclocksync.py
+
+Prints one line per check and exits with status 1 if any failed."""
+from __future__ import print_function
+import sys, numpy as np
+import clocksync
+
+failed = []
+
+def check(name, error, tolerance):
+	ok = error <= tolerance
+	if not ok:
+		failed.append(name)
+	print("{:52s} {:10.3g} {}".format(name, error, "ok" if ok else "FAILED"))
+
+def stream(tServer, offset, drift, minDelay=2e-4, meanDelay=1e-3, seed=3):
+	"Return client arrival times of packages sent at server times tServer."
+	rng = np.random.RandomState(seed)
+	delay = minDelay + rng.exponential(meanDelay - minDelay, len(tServer))
+	return tServer*(1 + drift) + offset + delay
+
+def driftAndOffset():
+	"The minimum delay line is found under exponential delays."
+	(offset, drift) = (1.5e9, 50e-6)
+	tServer = 100.0 + np.arange(0, 30, 0.0025) # 30 s at 400 Hz
+	tClient = stream(tServer, offset, drift)
+	clock = clocksync.ClockEstimator()
+	for (ts, tc) in zip(tServer, tClient):
+		clock.update(ts, tc)
+	(estimatedOffset, estimatedDrift, std, delay) = clock.getEstimate()
+	check("drift (s/s)", abs(estimatedDrift - drift), 1.5e-5) # 3 sd of the slope of 4000 delays of 0.8 ms sd over 10 s
+	exact = tServer*(1 + drift) + offset
+	error = np.abs(np.array([clock.toClient(ts) for ts in tServer[-4000:]]) - exact[-4000:]).max()
+	check("toClient, above the minimum delay 2e-4 s (s)", abs(error - 2e-4), 1e-4)
+	roundTrip = max(abs(clock.toServer(clock.toClient(ts)) - ts) for ts in tServer[::1000])
+	check("toServer inverts toClient (s)", roundTrip, 1e-6)
+
+def shortWindow():
+	"A window shorter than minSpan only fits the offset, the drift stays 0."
+	tServer = np.arange(0, 2, 0.0025)
+	tClient = stream(tServer, 10.0, 50e-6)
+	clock = clocksync.ClockEstimator()
+	for (ts, tc) in zip(tServer, tClient):
+		clock.update(ts, tc)
+	check("drift before minSpan (s/s)", abs(clock.getEstimate()[1]), 0)
+
+def restart():
+	"After restart the drift is kept and the offset follows a restarted server clock."
+	(offset, drift) = (10.0, 50e-6)
+	tServer = np.arange(0, 20, 0.0025)
+	clock = clocksync.ClockEstimator()
+	for (ts, tc) in zip(tServer, stream(tServer, offset, drift)):
+		clock.update(ts, tc)
+	driftBefore = clock.getEstimate()[1]
+	clock.restart()
+	tNew = np.arange(0, 1, 0.0025) # server restarted at 0, 20 s later on the client
+	for (ts, tc) in zip(tNew, stream(tNew, offset + 20.0, drift, seed=4)):
+		clock.update(ts, tc)
+	check("drift kept after restart (s/s)", abs(clock.getEstimate()[1] - driftBefore), 0)
+	check("offset after restart (s)", abs(clock.toClient(0.5) - (0.5*(1 + drift) + offset + 20.0)), 5e-4)
+
+if __name__ == '__main__':
+	driftAndOffset()
+	shortWindow()
+	restart()
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Checks of the motion predictors against numpy fits and exact motion.
+
+	python testpredictor.py
+
+Prints one line per check and exits with status 1 if any failed."""
+from __future__ import print_function
+import sys, numpy as np
+import predictor
+
+failed = []
+
+def check(name, error, tolerance):
+	ok = error <= tolerance
+	if not ok:
+		failed.append(name)
+	print("{:52s} {:10.3g} {}".format(name, error, "ok" if ok else "FAILED"))
+
+def quadraticAgainstPolyfit():
+	"QuadraticPredictor is the quadratic through the last three samples, at irregular times."
+	rng = np.random.RandomState(1)
+	t = np.cumsum(rng.uniform(0.002, 0.005, 50))
+	p = rng.normal(0, 0.1, (50, 4, 3)) # any values, the quadratic must go through the last three
+	pred = predictor.QuadraticPredictor()
+	error = 0.0
+	errorXVA = 0.0
+	for i in range(len(t)):
+		pred.update(p[i], t[i])
+		if i < 2:
+			continue
+		tq = t[i] + 1.0/60
+		c = np.polyfit(t[i-2:i+1], p[i-2:i+1].reshape(3, -1), 2) # highest power first
+		fit = (c[0]*tq**2 + c[1]*tq + c[2]).reshape(4, 3)
+		error = max(error, np.abs(pred.predict(tq) - fit).max())
+		v = (2*c[0]*tq + c[1]).reshape(4, 3)
+		a = np.broadcast_to(2*c[0], v.size).reshape(4, 3)
+		xva = pred.predictXVA(tq)
+		errorXVA = max(errorXVA, np.abs(xva[1] - v).max(), np.abs(xva[2] - a).max()/100)
+	check("QuadraticPredictor against np.polyfit", error, 1e-9)
+	check("QuadraticPredictor velocity, acceleration", errorXVA, 1e-6)
+
+def predictTimes():
+	"Batched predictions equal single ones."
+	pred = predictor.QuadraticPredictor()
+	for (i, t) in enumerate([0.0, 0.003, 0.007]):
+		pred.update(np.full((2, 3), t**2 + i), t)
+	times = np.linspace(0.007, 0.1, 7)
+	single = np.array([pred.predict(t) for t in times])
+	check("predictTimes against predict", np.abs(pred.predictTimes(times) - single).max(), 1e-12)
+
+def shift():
+	"A shifted predictor predicts the same at shifted times."
+	pred = predictor.QuadraticPredictor()
+	for t in [1.0, 1.004, 1.009]:
+		pred.update(np.full((1, 3), np.sin(t)), t)
+	before = pred.predict(1.02)
+	pred.shift(-1.0)
+	check("shift", np.abs(pred.predict(0.02) - before).max(), 1e-12)
+
+def filterSteadyState(PredictorClass, name, tolerance, **kwargs):
+	"""The kinematic filters follow constant acceleration without lag once they settled, and
+	reduce noise compared to the quadratic."""
+	dt = 0.0025
+	t = dt*np.arange(2000)
+	x = 0.1 + 0.2*t + 0.5*0.3*t**2 # constant acceleration 0.3 m/s**2
+	pred = PredictorClass(**kwargs)
+	for i in range(len(t)):
+		pred.update(np.array([[x[i], 0, 0]]), t[i])
+	tq = t[-1] + 1.0/60
+	exact = 0.1 + 0.2*tq + 0.5*0.3*tq**2
+	check("{} constant acceleration".format(name), abs(pred.predict(tq)[0,0] - exact), tolerance)
+
+	rng = np.random.RandomState(2)
+	noise = 1e-4 # m
+	errors = {}
+	for Class in [PredictorClass, predictor.QuadraticPredictor]:
+		pred = Class(**kwargs) if Class is PredictorClass else Class()
+		e = []
+		for i in range(len(t)):
+			pred.update(np.array([[x[i] + rng.normal(0, noise), 0, 0]]), t[i])
+			if i > len(t)//2:
+				tq = t[i] + 1.0/60
+				e.append(pred.predict(tq)[0,0] - (0.1 + 0.2*tq + 0.5*0.3*tq**2))
+		errors[Class] = np.std(e)
+	check("{} noise relative to quadratic".format(name), errors[PredictorClass]/errors[predictor.QuadraticPredictor], 0.1)
+
+if __name__ == '__main__':
+	quadraticAgainstPolyfit()
+	predictTimes()
+	shift()
+	filterSteadyState(predictor.AlphaBetaGammaPredictor, "AlphaBetaGammaPredictor", 1e-6)
+	filterSteadyState(predictor.KalmanPredictor, "KalmanPredictor", 1e-6, measurementNoise=1e-8)
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Checks of a session recorded with recorder.Recorder and streamed again by
+rtc3dserver.ReplayServer.
+
+	python testrecorder.py
+
+Prints one line per check and exits with status 1 if any failed."""
+from __future__ import print_function
+import sys, os, time, shutil, tempfile, numpy as np
+import fpclient, recorder, rtc3dclient, rtc3dserver
+
+failed = []
+
+def check(name, error, tolerance=0):
+	ok = error <= tolerance
+	if not ok:
+		failed.append(name)
+	print("{:52s} {:10.3g} {}".format(name, error, "ok" if ok else "FAILED"))
+
+def record(server, fileName, n=None, duration=0.5):
+	"Record the stream of server until it sent n packages, or for duration s."
+	server.port = 0 # any free port
+	server.start()
+	client = fpclient.FpClient()
+	client.connect("localhost", server.sock.getsockname()[1])
+	client.startRecording(fileName, nPackage=100000, nByte=1<<24, flushInterval=0.01)
+	client.startStream()
+	tEnd = time.time() + (5.0 if n else duration)
+	while time.time() < tEnd and (n is None or client.recorder.n < n):
+		time.sleep(0.01)
+	client.stopStream()
+	client.thread.join()
+	client.stopRecording()
+	client.close()
+	server.stop()
+	return recorder.Recording(fileName)
+
+def roundTrip(directory):
+	"""Recorded packages are the ones the server sent, and a replay as fast as possible
+	sends them unchanged."""
+	synthetic = rtc3dserver.SyntheticServer(speed=0, rate=400.0, nMarker=3, nAnalog=2)
+	recording = record(synthetic, os.path.join(directory, "synthetic"))
+	records = recording.records
+	errors = 0
+	for i in range(len(recording)):
+		(pType, pContent, frame, tServer, tArrival) = recording.package(i)
+		errors += pType != 3 or pContent.tobytes() != synthetic.package(frame, frame/400.0)
+	check("recorded packages, packages differing from sent", errors)
+	check("recorded frames, missing", records['frame'][-1] + 1 - len(recording))
+	check("recorded server times (s)", np.abs(records['tServer'] - records['frame']/400.0).max(), 1e-6)
+
+	replay = rtc3dserver.ReplayServer(recording.fileName, speed=0)
+	replayed = record(replay, os.path.join(directory, "replay"), n=len(recording))
+	check("replayed packages, missing", len(recording) - len(replayed))
+	errors = sum(replayed.package(i)[1].tobytes() != recording.package(i)[1].tobytes() for i in range(len(replayed)))
+	check("replayed packages, differing from recorded", errors)
+
+def replaySpeed(directory):
+	"""The schedule of the replay is the recorded arrival times, which the stream thread
+	divides by speed. At speed N the component times are divided by N as well, relative to
+	the first package."""
+	recording = record(rtc3dserver.SyntheticServer(rate=400.0), os.path.join(directory, "speed"), duration=0.3)
+	records = recording.records
+	speed = 4.0
+	(tSend, tServer) = np.array([(t, rtc3dclient.packageTime(pContent)[1]) for (t, pContent) in rtc3dserver.ReplayServer(recording.fileName, speed=speed).packages()]).T
+	check("replay send times (s)", np.abs(tSend - (records['tArrival'] - records['tArrival'][0])).max(), 1e-9)
+	t0 = records['tServer'][0]
+	check("replay component times at speed 4 (s)", np.abs(tServer - (t0 + (records['tServer'] - t0)/speed)).max(), 1e-6)
+
+def replayRepeat(directory):
+	"""With repeat, the component times of the next pass continue one frame interval after
+	the previous pass."""
+	recording = record(rtc3dserver.SyntheticServer(speed=0, rate=400.0), os.path.join(directory, "repeat"), duration=0.1)
+	n = len(recording)
+	packages = rtc3dserver.ReplayServer(recording.fileName, speed=1.0, repeat=True).packages()
+	tServer = np.array([rtc3dclient.packageTime(next(packages)[1])[1] for i in range(2*n)])
+	check("repeat, server time step between passes (s)", abs(tServer[n] - tServer[n-1] - 1/400.0), 1e-6)
+	check("repeat, intervals of the second pass (s)", np.abs(np.diff(tServer[n:]) - np.diff(tServer[:n])).max(), 1e-6)
+
+if __name__ == '__main__':
+	directory = tempfile.mkdtemp()
+	try:
+		roundTrip(directory)
+		replaySpeed(directory)
+		replayRepeat(directory)
+	finally:
+		shutil.rmtree(directory)
+	sys.exit(1 if failed else 0)
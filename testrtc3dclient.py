@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""Checks of the rtc3dclient decoders, FrameReader, command matching, reconnect and the
+ringbuffer seqlock.
+
+	python testrtc3dclient.py
+
+Prints one line per check and exits with status 1 if any failed."""
+from __future__ import print_function
+import sys, time, socket, struct, threading, numpy as np
+import rtc3dclient, ringbuffer, rtc3dserver
+
+failed = []
+
+def check(name, error, tolerance=0):
+	ok = error <= tolerance
+	if not ok:
+		failed.append(name)
+	print("{:52s} {:10.3g} {}".format(name, error, "ok" if ok else "FAILED"))
+
+def component(cType, frame, t, body):
+	return struct.pack(">IIIQ", 20+len(body), cType, frame, int(round(t*1e6))) + body
+
+def counted(values, fmt):
+	"Body of a counted component, values is count x width."
+	values = np.atleast_2d(values)
+	return struct.pack(">I", len(values)) + np.asarray(values, dtype=fmt).tobytes()
+
+def package(frame, t, markers, analog, tools, events):
+	components = [
+		component(1, frame, t, counted(markers, '>f4')),
+		component(2, frame, t, counted(np.asarray(analog)[:,None], '>f4')),
+		component(4, frame, t, counted(tools, '>f4')),
+		component(5, frame, t, counted(events, '>u4')),
+		component(1, frame, t, counted(markers[:1], '>f4')), # a second 3D component
+		]
+	return struct.pack(">I", len(components)) + b"".join(components)
+
+def decodePackage():
+	"All component types of a packed package come back as sent."
+	rng = np.random.RandomState(5)
+	markers = rng.uniform(-1e3, 1e3, (5, 4)).astype('>f4')
+	analog = rng.uniform(-5, 5, 8).astype('>f4')
+	tools = rng.uniform(-1, 1, (2, 8)).astype('>f4')
+	events = np.array([[1, 2], [3, 4]], dtype='>u4')
+	content = package(1234, 56.789012, markers, analog, tools, events)
+	(components, frame, t) = rtc3dclient.decodePackage(content)
+	check("decodePackage frame and time", abs(frame - 1234) + abs(t - 56.789012), 1e-9)
+	check("decodePackage 3D, two components", np.abs(components[1] - np.concatenate([markers, markers[:1]])).max())
+	check("decodePackage analog", np.abs(components[2] - analog).max())
+	check("decodePackage 6D", np.abs(components[4] - tools).max())
+	check("decodePackage event", np.abs(components[5].astype(int) - events).max())
+	(components, frame, t) = rtc3dclient.decodePackage(content, (2,))
+	check("decodePackage only the requested types", abs(sorted(components.keys()) != [2]))
+
+def decode3D():
+	"The markers of all 3D components of a package come back as sent, other components are skipped."
+	rng = np.random.RandomState(5)
+	markers = rng.uniform(-1e3, 1e3, (5, 4)).astype('>f4')
+	content = package(1234, 56.789012, markers, np.zeros(8), np.zeros((2, 8)), np.zeros((1, 2)))
+	(decoded, frame, t) = rtc3dclient.decode3D(content)
+	check("decode3D frame and time", abs(frame - 1234) + abs(t - 56.789012), 1e-9)
+	check("decode3D, two 3D components", np.abs(decoded - np.concatenate([markers, markers[:1]])).max())
+
+def packageTime():
+	"packageTime reads the frame and time of the first component without decoding."
+	content = package(1234, 56.789012, np.zeros((5, 4)), np.zeros(8), np.zeros((2, 8)), np.zeros((1, 2)))
+	(frame, t) = rtc3dclient.packageTime(content)
+	check("packageTime", abs(frame - 1234) + abs(t - 56.789012), 1e-9)
+
+def frameReader():
+	"""Packages sent in pieces of a few bytes, and one larger than the receive buffer, are
+	read back whole and in order."""
+	(a, b) = socket.socketpair()
+	bodies = [bytes(bytearray(range(i % 256)))*(i % 7 + 1) for i in range(200)] + [b"x"*5000]
+	data = b"".join(struct.pack(">II", len(body)+8, i % 4) + body for (i, body) in enumerate(bodies))
+	def send():
+		for i in range(0, len(data), 13):
+			a.sendall(data[i:i+13])
+		a.close()
+	thread = threading.Thread(target=send)
+	thread.start()
+	reader = rtc3dclient.FrameReader(b, size=1024)
+	errors = 0
+	for (i, body) in enumerate(bodies):
+		(pType, pContent) = reader.read()
+		errors += pType != i % 4 or bytes(pContent) != body
+	thread.join()
+	b.close()
+	check("FrameReader with partial reads, wrong packages", errors)
+
+def quaternions():
+	"quaternionsToMatrices against the closed form, for unnormalized quaternions."
+	rng = np.random.RandomState(6)
+	q = rng.normal(size=(20, 4))
+	r = rtc3dclient.quaternionsToMatrices(q)
+	error = 0.0
+	for (qi, ri) in zip(q, r):
+		(w, x, y, z) = qi/np.linalg.norm(qi)
+		exact = np.array([
+			[1-2*(y*y+z*z), 2*(x*y-w*z),   2*(x*z+w*y)],
+			[2*(x*y+w*z),   1-2*(x*x+z*z), 2*(y*z-w*x)],
+			[2*(x*z-w*y),   2*(y*z+w*x),   1-2*(x*x+y*y)]])
+		error = max(error, np.abs(ri - exact).max())
+	check("quaternionsToMatrices against closed form", error, 1e-12)
+
+class EchoServer(rtc3dserver.SyntheticServer):
+	"Answers every command with its own text."
+	def command(self, command):
+		return ("echo " + command).encode()
+
+def commands():
+	"""Commands pipelined from several threads while the stream runs each get their own
+	response, with the stream thread and with rtc3dasync."""
+	server = EchoServer(0, rate=400.0)
+	server.start()
+	port = server.sock.getsockname()[1]
+	clients = [rtc3dclient.Rtc3dClient()]
+	clients[0].connect("localhost", port)
+	clients[0].startStream()
+	if sys.version_info >= (3, 5):
+		import rtc3dasync
+		loop = rtc3dasync.StreamLoop()
+		clients.append(rtc3dclient.Rtc3dClient())
+		loop.connect(clients[-1], "localhost", port)
+	for client in clients:
+		futures = {}
+		def send(i):
+			bodies = ["command {} {}".format(i, j) for j in range(20)]
+			futures[i] = list(zip(bodies, client.command(*bodies)))
+		threads = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		errors = sum(future.result(3) != "echo " + body for i in futures for (body, future) in futures[i])
+		check("{}, responses of other commands".format("stream thread" if client is clients[0] else "rtc3dasync"), errors)
+	clients[0].stopStream()
+	clients[0].close()
+	if len(clients) > 1:
+		loop.stop()
+	server.stop()
+
+class DroppingServer(rtc3dserver.SyntheticServer):
+	"Closes all connections on drop(), like a server that restarts."
+	def __init__(self, *args, **kwargs):
+		super(DroppingServer, self).__init__(*args, **kwargs)
+		self.connections = []
+
+	def connectionThread(self, conn, address):
+		self.connections.append(conn)
+		super(DroppingServer, self).connectionThread(conn, address)
+
+	def drop(self):
+		for conn in self.connections:
+			conn.shutdown(socket.SHUT_RDWR)
+		self.connections = []
+
+def reconnect():
+	"""After the server dropped the connection, the client reconnects within the backoff and
+	predicts the motion again on the restarted server clock. Without a server it holds the 
+	last sample."""
+	server = DroppingServer(0, rate=400.0)
+	server.start()
+	client = rtc3dclient.Rtc3dClient()
+	client.connect("localhost", server.sock.getsockname()[1])
+	client.startStream()
+	client.waitReady(3)
+	time.sleep(0.5)
+	server.drop() # the new stream starts again at server time 0
+	tDrop = time.time()
+	n = client.history.n
+	while client.history.n < n + 40 and time.time() < tDrop + 3: # 0.1 s of new samples
+		time.sleep(0.001)
+	check("reconnect and 40 samples (s)", time.time() - tDrop, 1.0)
+	x = client.getPosition(dt=0)[0,0]
+	exact = server.move.getX(client.clock.toServer(client.time()))
+	check("position after reconnect (m)", abs(x - exact), 2e-3)
+	server.stop()
+	server.drop() # no server to reconnect to
+	while client.connected and time.time() < tDrop + 5:
+		time.sleep(0.001)
+	(p, dt) = client.getPosition2(dt=0.5)
+	check("position held while disconnected (m)", np.abs(p - client.history.last(1)[0][0]).max() + abs(dt), 1e-9)
+	client.stopStream()
+	client.close()
+
+def seqlock():
+	"""A reader of the last k samples must retry exactly when the writer overwrote one of
+	them: after capacity-k+1 appends, not after capacity-k."""
+	(capacity, k) = (16, 3)
+	errors = 0
+	for nWritten in range(2*capacity):
+		history = ringbuffer.RingBuffer(capacity)
+		for i in range(capacity):
+			history.append(np.full((1, 3), i), i, i)
+		seq = history.begin()
+		(p, t, ta) = history.last(k)
+		first = t.copy()
+		for i in range(nWritten):
+			history.append(np.full((1, 3), -1), -1, -1)
+		overwritten = (t != first).any() # the views see the writer
+		errors += history.retry(seq, k) != (nWritten > capacity - k) or (overwritten and not history.retry(seq, k))
+	check("RingBuffer retry bound", errors)
+
+if __name__ == '__main__':
+	decodePackage()
+	decode3D()
+	packageTime()
+	frameReader()
+	quaternions()
+	commands()
+	reconnect()
+	seqlock()
+	sys.exit(1 if failed else 0)